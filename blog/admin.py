@@ -1,18 +1,13 @@
 from django.contrib import admin
-from blog.models import Post, Tag, Comment
+from blog.models import Comment, PageViewCount, Post, Tag
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'published_at', 'comments_count']
+    list_display = ['title', 'author', 'published_at', 'likes_count', 'comments_count']
     raw_id_fields = ['author', 'tags']
     exclude = ('likes',)
 
-    def comments_count(self, obj):
-        return obj.comments.count()
-
-    comments_count.short_description = 'Комментарии'
-
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -24,9 +19,9 @@ class CommentAdmin(admin.ModelAdmin):
 class TagAdmin(admin.ModelAdmin):
     list_display = ['title', 'posts_count']
 
-    def posts_count(self, obj):
-        return obj.posts.count()
-
-    posts_count.short_description = 'Посты'
-
 
+@admin.register(PageViewCount)
+class PageViewCountAdmin(admin.ModelAdmin):
+    list_display = ['path', 'minute', 'views']
+    list_filter = ['minute']
+    raw_id_fields = ['post']
@@ -0,0 +1,148 @@
+"""
+JSON API только для чтения: список постов, пост, теги и полная выгрузка.
+
+Посты и теги отдаются в тех же формах, что и в шаблоны, — serialize_post и
+serialize_tag — плюс количество лайков и адрес страницы. Выгрузка всех постов
+идёт потоком: посты читаются из базы пачками через iterator(), и в памяти
+никогда не лежит больше одной пачки.
+"""
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from blog import likes
+from blog.conditional import conditional_page, get_post_last_modified, get_site_last_modified
+from blog.models import Post, Tag
+from blog.pagination import paginate_keyset
+from blog.replicas import use_replica
+from blog.serializers import serialize_comment, serialize_post, serialize_tag
+
+POSTS_PER_PAGE = 20
+MAX_POSTS_PER_PAGE = 100
+COMMENTS_PER_PAGE = 20
+EXPORT_CHUNK_SIZE = 500
+
+
+def serialize_api_post(post):
+    return {
+        **serialize_post(post),
+        # Как на странице поста: лайки из буфера ещё не попали в likes_count
+        'likes_amount': post.likes_amount + likes.get_pending_delta(post.id),
+        'url': reverse('post_detail', kwargs={'slug': post.slug}),
+    }
+
+
+def get_per_page(request):
+    try:
+        per_page = int(request.GET.get('per_page', POSTS_PER_PAGE))
+    except ValueError:
+        return POSTS_PER_PAGE
+    return min(max(per_page, 1), MAX_POSTS_PER_PAGE)
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
+def post_list(request):
+    posts = Post.objects.all()
+    tag_title = request.GET.get('tag')
+    if tag_title:
+        posts = Post.objects.with_tag(get_object_or_404(Tag, title=tag_title))
+    posts = (
+        posts.fresh()
+        .defer('text')
+        .with_counts()
+        .select_related('author')
+        .prefetch_related(Tag.objects.prefetch_with_post_count())
+    )
+    page = paginate_keyset(posts, request.GET.get('cursor'), per_page=get_per_page(request))
+    return JsonResponse({
+        'posts': [serialize_api_post(post) for post in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@use_replica
+@conditional_page(get_post_last_modified)
+def post_detail(request, slug):
+    post = get_object_or_404(
+        Post.objects
+        .with_counts()
+        .select_related('author')
+        .prefetch_related(Tag.objects.prefetch_with_post_count()),
+        slug=slug,
+    )
+    comments_page = paginate_keyset(
+        post.comments.select_related('author'),
+        None,
+        per_page=COMMENTS_PER_PAGE,
+        ordering=('published_at', 'id'),
+    )
+    return JsonResponse({
+        'post': {
+            **serialize_api_post(post),
+            'text': post.text,
+            'comments': [serialize_comment(comment) for comment in comments_page.items],
+            'comments_next_cursor': comments_page.next_cursor,
+            'comments_url': reverse('post_comments', kwargs={'slug': post.slug}),
+        },
+    })
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
+def tag_list(request):
+    return JsonResponse({'tags': [serialize_tag(tag) for tag in Tag.objects.all()]})
+
+
+def iter_export_posts(chunk_size):
+    """Посты с текстом, тегами и счётчиками, теги догружаются одним запросом на пачку."""
+    posts = Post.objects.order_by('id').with_counts().select_related('author').iterator(chunk_size=chunk_size)
+    chunk = []
+    for post in posts:
+        chunk.append(post)
+        if len(chunk) == chunk_size:
+            yield from attach_tags(chunk)
+            chunk = []
+    yield from attach_tags(chunk)
+
+
+def attach_tags(posts):
+    # prefetch_related вместе с iterator() умеет не всякая версия Django, поэтому теги грузим сами
+    tags_by_post = defaultdict(list)
+    post_tags = (
+        Post.tags.through.objects
+        .filter(post_id__in=[post.id for post in posts])
+        .select_related('tag')
+        .order_by('tag__title')
+    )
+    for post_tag in post_tags:
+        tags_by_post[post_tag.post_id].append(post_tag.tag)
+    for post in posts:
+        post.annotated_tags = tags_by_post[post.id]
+        yield post
+
+
+def stream_export(chunk_size):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    # Отдаём по пачке постов за раз: запись в сокет на каждый пост дороже самого поста
+    parts = ['{"posts": [']
+    for number, post in enumerate(iter_export_posts(chunk_size)):
+        if number:
+            parts.append(',')
+        parts.append(encoder.encode({**serialize_api_post(post), 'text': post.text}))
+        if len(parts) >= 2 * chunk_size:
+            yield ''.join(parts)
+            parts = []
+    parts.append(']}')
+    yield ''.join(parts)
+
+
+def export(request):
+    # Поток читается уже после выхода из вьюхи, поэтому use_replica здесь не поможет
+    response = StreamingHttpResponse(stream_export(EXPORT_CHUNK_SIZE), content_type='application/json')
+    response['Content-Disposition'] = 'attachment; filename="posts.json"'
+    return response
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from blog import signals, sqlite  # noqa: F401
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # Документация шаблона и исходники SCSS на сайте не нужны
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + ['Sensive Blog -doc', 'scss', 'Thumbs.db']
@@ -0,0 +1,85 @@
+"""
+Архив по годам и месяцам.
+
+Количество постов за каждый месяц хранится в ArchiveMonth, поэтому сайдбару
+не нужно группировать всю таблицу постов. Сигналы поддерживают таблицу при
+публикации, переносе и удалении поста, rebuild() пересобирает её целиком —
+после массовой загрузки постов мимо сигналов.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from blog.models import ArchiveMonth, Post
+
+SIDEBAR_MONTHS = 12
+
+
+def get_month(published_at):
+    published_at = timezone.localtime(published_at)
+    return published_at.year, published_at.month
+
+
+def add_post(published_at):
+    year, month = get_month(published_at)
+    archive_month, created = ArchiveMonth.objects.get_or_create(
+        year=year,
+        month=month,
+        defaults={'posts_count': 1},
+    )
+    if not created:
+        ArchiveMonth.objects.filter(id=archive_month.id).update(posts_count=F('posts_count') + 1)
+
+
+def recount_months(months):
+    """Пересчитывает месяцы (год, месяц) по индексу published_at, пустые удаляет."""
+    for year, month in months:
+        posts_count = Post.objects.month(year, month).count()
+        if posts_count:
+            ArchiveMonth.objects.update_or_create(year=year, month=month, defaults={'posts_count': posts_count})
+        else:
+            ArchiveMonth.objects.filter(year=year, month=month).delete()
+
+
+def rebuild():
+    months = (
+        Post.objects
+        .annotate(published_month=TruncMonth('published_at'))
+        .order_by()
+        .values('published_month')
+        .annotate(posts_count=Count('id'))
+    )
+    with transaction.atomic():
+        ArchiveMonth.objects.all().delete()
+        ArchiveMonth.objects.bulk_create([
+            ArchiveMonth(
+                year=row['published_month'].year,
+                month=row['published_month'].month,
+                posts_count=row['posts_count'],
+            )
+            for row in months
+        ])
+
+
+def serialize_archive_month(archive_month):
+    return {
+        'year': archive_month.year,
+        'month': archive_month.month,
+        # Для фильтра date в шаблоне
+        'date': datetime.date(archive_month.year, archive_month.month, 1),
+        'posts_count': archive_month.posts_count,
+    }
+
+
+def get_archive_sidebar():
+    months = list(ArchiveMonth.objects.all())
+    years = {}
+    for archive_month in months:
+        years[archive_month.year] = years.get(archive_month.year, 0) + archive_month.posts_count
+    return {
+        'archive_months': [serialize_archive_month(archive_month) for archive_month in months[:SIDEBAR_MONTHS]],
+        'archive_years': [{'year': year, 'posts_count': posts_count} for year, posts_count in years.items()],
+    }
@@ -0,0 +1,45 @@
+import subprocess
+import time
+
+from django.conf import settings
+
+# Команды на временной базе чистят кэш, а общий кэш сайта им трогать нельзя
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+LOCAL_CACHES = {
+    'default': {'BACKEND': LOCMEM_CACHE, 'LOCATION': 'benchmark'},
+    'template_fragments': {'BACKEND': LOCMEM_CACHE, 'LOCATION': 'benchmark-fragments'},
+}
+
+
+def percentile(sorted_values, percent):
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+def measure_ms(func, *args, **kwargs):
+    started_at = time.perf_counter()
+    func(*args, **kwargs)
+    return (time.perf_counter() - started_at) * 1000
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
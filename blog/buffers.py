@@ -0,0 +1,56 @@
+"""
+Фоновый сброс буферов в базу.
+
+PeriodicFlusher раз в interval секунд вызывает функцию flush в отдельном
+потоке, а при выходе процесса — последний раз. Поток запускается при первой
+записи в буфер, поэтому в процессах, которые ничего не буферизуют, его нет.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    def __init__(self, name, flush, interval):
+        self.name = name
+        self.flush = flush
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._exit_registered = False
+
+    def start(self):
+        # После fork поток родителя в дочернем процессе не живёт, is_alive() это увидит
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            if not self._exit_registered:
+                atexit.register(self.flush_now)
+                self._exit_registered = True
+
+    def wake(self):
+        """Сбросить буфер, не дожидаясь интервала: например, когда он переполнен."""
+        self._wakeup.set()
+
+    def flush_now(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось сбросить буфер %s', self.name)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            # Соединение потока живёт между сбросами, как соединение воркера между запросами
+            close_old_connections()
+            self.flush_now()
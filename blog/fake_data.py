@@ -0,0 +1,178 @@
+"""
+Генератор синтетических данных для нагрузочных проверок.
+
+Популярность постов и тегов распределена по закону Ципфа: несколько постов
+собирают основную массу лайков и комментариев, у тегов длинный хвост.
+Всё пишется через bulk_create пачками, сигналы не срабатывают, поэтому
+поисковый индекс и счётчики обновляются явно.
+"""
+import datetime
+import itertools
+import random
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from blog import archive, leaderboard, related, search, sidebar
+from blog.models import Comment, Post, Tag
+
+FAKE_USER_PREFIX = 'fake-user-'
+FAKE_TAG_PREFIX = 'fake'
+FAKE_POST_PREFIX = 'fake-post-'
+
+WORDS = (
+    'бизнес успех деньги семья дети совет жизнь работа время цель команда '
+    'клиент продажи рост привычка здоровье отдых книга идея решение'
+).split()
+SYLLABLES = 'ба ве ги до ку ла ми но пе ра со ту фи ха це чу ша эм юн як'.split()
+VOCABULARY_SIZE = 20000
+
+
+def zipf_weights(amount, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, amount + 1)]
+
+
+def build_vocabulary(size):
+    """Частые настоящие слова и длинный хвост выдуманных, как в живом тексте."""
+    rnd = random.Random(0)
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+VOCABULARY = build_vocabulary(VOCABULARY_SIZE)
+VOCABULARY_CUM_WEIGHTS = list(itertools.accumulate(zipf_weights(VOCABULARY_SIZE)))
+
+
+def make_text(rnd, words_amount):
+    words = rnd.choices(VOCABULARY, cum_weights=VOCABULARY_CUM_WEIGHTS, k=words_amount)
+    return ' '.join(words).capitalize() + '.'
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def next_number(model, field, prefix):
+    return model.objects.filter(**{f'{field}__startswith': prefix}).count()
+
+
+def create_users(amount, batch_size):
+    start = next_number(User, 'username', FAKE_USER_PREFIX)
+    users = [
+        User(username=f'{FAKE_USER_PREFIX}{number}', is_staff=number % 20 == 0)
+        for number in range(start, start + amount)
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+
+
+def create_tags(amount, batch_size):
+    start = next_number(Tag, 'title', FAKE_TAG_PREFIX)
+    tags = [Tag(title=f'{FAKE_TAG_PREFIX}{number}') for number in range(start, start + amount)]
+    Tag.objects.bulk_create(tags, batch_size=batch_size)
+
+
+def create_posts(rnd, amount, batch_size):
+    author_ids = list(User.objects.filter(is_staff=True).values_list('id', flat=True))
+    if not author_ids:
+        author_ids = [User.objects.create(username=f'{FAKE_USER_PREFIX}author', is_staff=True).id]
+    tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+    tag_weights = zipf_weights(len(tag_ids))
+
+    start = next_number(Post, 'slug', FAKE_POST_PREFIX)
+    now = timezone.now()
+    post_ids = []
+    for numbers in chunked(range(start, start + amount), batch_size):
+        with transaction.atomic():
+            posts = [
+                Post(
+                    title=make_text(rnd, rnd.randint(3, 8)),
+                    text=make_text(rnd, rnd.randint(100, 1500)),
+                    slug=f'{FAKE_POST_PREFIX}{number}',
+                    image='',
+                    published_at=now - datetime.timedelta(seconds=rnd.randint(0, 3 * 365 * 24 * 3600)),
+                    author_id=rnd.choice(author_ids),
+                )
+                for number in numbers
+            ]
+            # bulk_create не вызывает save(), который заполняет начало текста
+            for post in posts:
+                post.fill_teaser()
+            posts = Post.objects.bulk_create(posts)
+            post_tags = []
+            if tag_ids:
+                for post in posts:
+                    chosen = set(rnd.choices(tag_ids, weights=tag_weights, k=rnd.randint(1, 4)))
+                    post_tags.extend(Post.tags.through(post_id=post.id, tag_id=tag_id) for tag_id in chosen)
+            Post.tags.through.objects.bulk_create(post_tags, batch_size=batch_size)
+            search.index_posts([post.id for post in posts])
+        post_ids.extend(post.id for post in posts)
+    return post_ids
+
+
+def spread_by_popularity(rnd, post_ids, amount):
+    """Раскидывает amount событий по постам: первым в случайном порядке достаётся больше всего."""
+    shuffled = rnd.sample(post_ids, len(post_ids))
+    return Counter(rnd.choices(shuffled, weights=zipf_weights(len(shuffled)), k=amount))
+
+
+def create_likes(rnd, post_ids, amount, batch_size):
+    user_ids = list(User.objects.values_list('id', flat=True))
+    likes = []
+    for post_id, likes_amount in spread_by_popularity(rnd, post_ids, amount).items():
+        for user_id in rnd.sample(user_ids, min(likes_amount, len(user_ids))):
+            likes.append(Post.likes.through(post_id=post_id, user_id=user_id))
+    for batch in chunked(likes, batch_size):
+        Post.likes.through.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def create_comments(rnd, post_ids, amount, batch_size):
+    user_ids = list(User.objects.values_list('id', flat=True))
+    now = timezone.now()
+    comments = []
+    for post_id, comments_amount in spread_by_popularity(rnd, post_ids, amount).items():
+        for _ in range(comments_amount):
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=rnd.choice(user_ids),
+                text=make_text(rnd, rnd.randint(5, 60)),
+                published_at=now - datetime.timedelta(seconds=rnd.randint(0, 365 * 24 * 3600)),
+            ))
+        if len(comments) >= batch_size:
+            Comment.objects.bulk_create(comments, batch_size=batch_size)
+            comments = []
+    Comment.objects.bulk_create(comments, batch_size=batch_size)
+
+
+def recount(post_ids, batch_size):
+    for batch in chunked(post_ids, batch_size):
+        with transaction.atomic():
+            posts = Post.objects.filter(id__in=batch)
+            posts.recount_likes()
+            posts.recount_comments()
+    Tag.objects.recount_posts()
+    archive.rebuild()
+    related.rebuild()
+    leaderboard.invalidate()
+    sidebar.invalidate()
+
+
+def generate(users=0, tags=0, posts=0, likes=0, comments=0, batch_size=1000, seed=None):
+    """Добавляет в базу указанное количество объектов и возвращает id созданных постов."""
+    rnd = random.Random(seed)
+    create_users(users, batch_size)
+    create_tags(tags, batch_size)
+    post_ids = create_posts(rnd, posts, batch_size)
+    if post_ids:
+        create_likes(rnd, post_ids, likes, batch_size)
+        create_comments(rnd, post_ids, comments, batch_size)
+    recount(post_ids, batch_size)
+    return post_ids
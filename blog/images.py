@@ -0,0 +1,168 @@
+"""
+Уменьшенные копии Post.image для srcset.
+
+Копии лежат в MEDIA_ROOT/derivatives/<хэш содержимого>/, поэтому одна и та
+же картинка у разных постов обрабатывается один раз, а новая загрузка сразу
+получает новые адреса и не упирается в кэш браузера. Кроме исходного формата
+сохраняется WebP, если Pillow собран с его поддержкой, — и в полную ширину
+картинки: широкому экрану в исходном формате достанется сам файл.
+
+Новая картинка обрабатывается не при сохранении поста, а в фоновом потоке:
+после коммита id поста ложится в буфер, и раз в IMAGE_DERIVATIVES_INTERVAL
+секунд копии создаются для всех постов из него. Пока копий нет, страницы
+показывают исходный файл.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from blog.buffers import PeriodicFlusher
+from blog.models import Post
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# id постов, которым нужны копии картинки
+_pending_ids = set()
+
+DERIVATIVE_WIDTHS = (100, 400, 800)
+DERIVATIVES_DIR = 'derivatives'
+
+
+def content_hash(image_file):
+    digest = hashlib.sha1()
+    image_file.seek(0)
+    for chunk in iter(lambda: image_file.read(64 * 1024), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_fallback_format(image):
+    return 'PNG' if image.mode in ('RGBA', 'LA', 'P') else 'JPEG'
+
+
+def save_variant(image, name, image_format):
+    if default_storage.exists(name):
+        return
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=82, optimize=True)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_derivatives(image_name):
+    """Создаёт копии картинки и возвращает описание для Post.image_derivatives."""
+    try:
+        with default_storage.open(image_name, 'rb') as image_file:
+            digest = content_hash(image_file)
+            image_file.seek(0)
+            source = ImageOps.exif_transpose(Image.open(image_file))
+            source.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Не удалось прочитать картинку %s', image_name, exc_info=True)
+        return None
+
+    formats = [get_fallback_format(source)]
+    if features.check('webp'):
+        formats.append('WEBP')
+
+    widths = [(width, formats) for width in DERIVATIVE_WIDTHS if width < source.width]
+    # В полную ширину исходный формат — это сам файл, а WebP надо сделать
+    full_width_formats = formats[1:] if widths else formats
+    if full_width_formats:
+        widths.append((source.width, full_width_formats))
+
+    variants = []
+    try:
+        for width, width_formats in widths:
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+            for image_format in width_formats:
+                name = posixpath.join(DERIVATIVES_DIR, digest, f'{width}.{image_format.lower()}')
+                save_variant(resized, name, image_format)
+                variants.append({'width': width, 'format': image_format.lower(), 'name': name})
+    except (OSError, ValueError):
+        logger.warning('Не удалось сохранить копии картинки %s', image_name, exc_info=True)
+        return None
+
+    return {'source': image_name, 'hash': digest, 'width': source.width, 'variants': variants}
+
+
+def needs_derivatives(post):
+    return bool(post.image) and post.image_derivatives.get('source') != post.image.name
+
+
+def ensure_derivatives(post):
+    if not needs_derivatives(post):
+        return
+    derivatives = build_derivatives(post.image.name)
+    if derivatives is None:
+        return
+    post.image_derivatives = derivatives
+    Post.objects.filter(id=post.id).update(image_derivatives=derivatives, updated_at=timezone.now())
+
+
+def queue_derivatives(post_ids):
+    with _lock:
+        _pending_ids.update(post_ids)
+    flusher.start()
+
+
+def flush():
+    """Создаёт копии картинок постов из буфера. Возвращает количество обработанных постов."""
+    global _pending_ids
+    with _lock:
+        post_ids, _pending_ids = _pending_ids, set()
+    posts = Post.objects.filter(id__in=post_ids).only('id', 'image', 'image_derivatives')
+    processed = 0
+    for post in posts:
+        # Одна битая картинка или сбой хранилища не должны остановить остальные
+        try:
+            ensure_derivatives(post)
+        except Exception:
+            logger.exception('Не удалось создать копии картинки поста %s', post.id)
+            continue
+        processed += 1
+    return processed
+
+
+def get_srcset(derivatives, image_format):
+    return ', '.join(
+        f'{default_storage.url(variant["name"])} {variant["width"]}w'
+        for variant in derivatives.get('variants', [])
+        if variant['format'] == image_format
+    )
+
+
+def serialize_image(post):
+    if not post.image:
+        return {'image_url': None, 'thumbnail_url': None, 'image_srcset': '', 'image_webp_srcset': ''}
+
+    derivatives = post.image_derivatives
+    variants = derivatives.get('variants', [])
+    if not variants:
+        return {'image_url': post.image.url, 'thumbnail_url': post.image.url, 'image_srcset': '', 'image_webp_srcset': ''}
+
+    fallback_format = variants[0]['format']
+    fallback_srcset = get_srcset(derivatives, fallback_format)
+    fallback_widths = [variant['width'] for variant in variants if variant['format'] == fallback_format]
+    if derivatives['width'] > max(fallback_widths):
+        fallback_srcset += f', {post.image.url} {derivatives["width"]}w'
+    return {
+        'image_url': post.image.url,
+        'thumbnail_url': default_storage.url(variants[0]['name']),
+        'image_srcset': fallback_srcset,
+        'image_webp_srcset': get_srcset(derivatives, 'webp'),
+    }
+
+
+flusher = PeriodicFlusher('image-derivatives-builder', flush, settings.IMAGE_DERIVATIVES_INTERVAL)
@@ -0,0 +1,61 @@
+"""
+Лидерборд самых залайканных постов.
+
+В кэше лежит отсортированный список пар (id поста, количество лайков) длиной
+LEADERBOARD_SIZE, и за полным топом в базу ходить не нужно: достаточно
+прочитать K строк по готовым id.
+
+Список лежит под ключом с версией, как сайдбар. Лайки, новые и удалённые посты
+после коммита меняют версию, и следующий запрос собирает список заново одним
+запросом по индексу likes_count. Правка списка на месте — это чтение и запись
+без блокировки: два процесса теряли бы обновления друг друга.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from blog.models import Post
+from blog.replicas import read_from_default
+
+LEADERBOARD_VERSION_KEY = 'blog:leaderboard:version'
+LEADERBOARD_KEY = 'blog:leaderboard:popular-posts:{version}'
+LEADERBOARD_SIZE = 50
+LEADERBOARD_TIMEOUT = 24 * 60 * 60
+
+
+def get_version():
+    version = cache.get(LEADERBOARD_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(LEADERBOARD_VERSION_KEY, version, None)
+        version = cache.get(LEADERBOARD_VERSION_KEY, version)
+    return version
+
+
+def rebuild(version):
+    # Версию читаем до запроса: если её сменят, пока идёт запрос, список ляжет под старый ключ.
+    # Читаем с default: отставшая реплика положила бы под новую версию старый список
+    with read_from_default():
+        entries = list(
+            Post.objects
+            .order_by('-likes_count', '-id')
+            .values_list('id', 'likes_count')[:LEADERBOARD_SIZE]
+        )
+    cache.set(LEADERBOARD_KEY.format(version=version), entries, LEADERBOARD_TIMEOUT)
+    return entries
+
+
+def invalidate():
+    # До коммита другой процесс собрал бы список из старых данных уже под новой версией
+    transaction.on_commit(lambda: cache.set(LEADERBOARD_VERSION_KEY, time.time_ns(), None))
+
+
+def get_top_post_ids(limit):
+    if limit > LEADERBOARD_SIZE:
+        return None
+    version = get_version()
+    entries = cache.get(LEADERBOARD_KEY.format(version=version))
+    if entries is None:
+        entries = rebuild(version)
+    return [post_id for post_id, _ in entries[:limit]]
@@ -0,0 +1,197 @@
+"""
+Лайки с отложенной записью.
+
+Клик по сердечку не пишет в базу: намерение «лайк» или «не лайк» ложится в
+буфер в памяти процесса, последнее намерение пользователя побеждает. Фоновый
+поток раз в LIKES_FLUSH_INTERVAL секунд забирает из буфера пачки по
+LIKES_FLUSH_BATCH_SIZE и применяет каждую одной транзакцией: bulk_create с
+ignore_conflicts для лайков, один DELETE для снятых лайков и пересчёт
+likes_count затронутых постов.
+
+В буфер попадают только изменения относительно базы, поэтому для каждого поста
+известна разница, которая ещё не записана. Её прибавляют к likes_count те, кто
+показывает количество лайков, — автор клика сразу видит свой лайк.
+"""
+import functools
+import operator
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from blog import leaderboard, sidebar
+from blog.buffers import PeriodicFlusher
+from blog.models import Post
+
+Like = Post.likes.through
+
+_lock = threading.Lock()
+# В полёте не больше одной пачки, даже если flush вызвали из команды или при выходе
+_flush_lock = threading.Lock()
+# (id поста, id пользователя) -> лайкнул ли, только то, что отличается от базы
+_pending = {}
+# Пачка, которую сейчас записывает flush
+_in_flight = {}
+# Разница с likes_count в базе по постам, для _pending и _in_flight вместе
+_deltas = Counter()
+# Растёт после каждой записанной пачки, чтобы заметить, что база поменялась под ногами
+_generation = 0
+
+
+def _buffered_state(key):
+    if key in _pending:
+        return _pending[key]
+    return _in_flight.get(key)
+
+
+def _add_delta(post_id, liked, sign=1):
+    _deltas[post_id] += sign if liked else -sign
+    if not _deltas[post_id]:
+        del _deltas[post_id]
+
+
+def set_like(post_id, user_id, liked):
+    """
+    Запоминает, что пользователь лайкнул пост или снял лайк. Повторный вызов
+    с тем же liked ничего не меняет. Возвращает, изменилось ли что-нибудь.
+    """
+    return _change_like(post_id, user_id, lambda current: liked)[1]
+
+
+def toggle_like(post_id, user_id):
+    """Ставит лайк, если его нет, и снимает, если есть. Возвращает, лайкнут ли пост теперь."""
+    return _change_like(post_id, user_id, operator.not_)[0]
+
+
+def _change_like(post_id, user_id, choose):
+    """choose(лайкнут ли сейчас) -> нужен ли лайк. Возвращает (лайкнут ли теперь, изменилось ли)."""
+    key = (post_id, user_id)
+    while True:
+        with _lock:
+            current = _buffered_state(key)
+            generation = _generation
+        if current is None:
+            current = Like.objects.filter(post_id=post_id, user_id=user_id).exists()
+
+        with _lock:
+            if _generation != generation and key not in _pending and key not in _in_flight:
+                # Пока читали базу, туда записали пачку с этим ключом, читаем заново
+                continue
+            buffered = _buffered_state(key)
+            if buffered is not None:
+                current = buffered
+            liked = choose(current)
+            if current == liked:
+                return liked, False
+
+            if key in _pending:
+                # Новое намерение отменяет ещё не записанное
+                _add_delta(post_id, _pending.pop(key), sign=-1)
+            else:
+                _pending[key] = liked
+                _add_delta(post_id, liked)
+            buffer_size = len(_pending)
+            break
+
+    flusher.start()
+    if buffer_size >= settings.LIKES_FLUSH_BATCH_SIZE:
+        flusher.wake()
+    return liked, True
+
+
+def get_pending_delta(post_id):
+    with _lock:
+        return _deltas.get(post_id, 0)
+
+
+def get_likes_amount(post_id):
+    likes_count = Post.objects.filter(id=post_id).values_list('likes_count', flat=True).first() or 0
+    return likes_count + get_pending_delta(post_id)
+
+
+def apply_batch(batch):
+    post_ids = sorted({post_id for post_id, _ in batch})
+    user_ids = {user_id for _, user_id in batch}
+
+    # bulk-операции не шлют m2m_changed, счётчики и кэши обновляем здесь
+    with transaction.atomic():
+        # Пост или пользователя могли удалить, пока намерение лежало в буфере
+        existing_post_ids = set(Post.objects.filter(id__in=post_ids).values_list('id', flat=True))
+        existing_user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        added = [
+            Like(post_id=post_id, user_id=user_id)
+            for (post_id, user_id), liked in batch.items()
+            if liked and post_id in existing_post_ids and user_id in existing_user_ids
+        ]
+        removed = defaultdict(list)
+        for (post_id, user_id), liked in batch.items():
+            if not liked:
+                removed[post_id].append(user_id)
+
+        if added:
+            Like.objects.bulk_create(added, ignore_conflicts=True)
+        if removed:
+            Like.objects.filter(functools.reduce(operator.or_, (
+                Q(post_id=post_id, user_id__in=user_ids)
+                for post_id, user_ids in removed.items()
+            ))).delete()
+        Post.objects.filter(id__in=post_ids).recount_likes()
+
+    leaderboard.invalidate()
+    sidebar.invalidate()
+
+
+def flush_batch(batch_size):
+    """Записывает в базу одну пачку из буфера. Возвращает её размер."""
+    global _generation
+    with _flush_lock:
+        with _lock:
+            keys = list(_pending)[:batch_size]
+            for key in keys:
+                _in_flight[key] = _pending.pop(key)
+            batch = dict(_in_flight)
+        if not batch:
+            return 0
+
+        try:
+            apply_batch(batch)
+        except Exception:
+            # Возвращаем пачку в буфер, если пользователь не успел передумать
+            with _lock:
+                for key, liked in batch.items():
+                    del _in_flight[key]
+                    if key in _pending:
+                        _add_delta(key[0], liked, sign=-1)
+                        _add_delta(key[0], _pending.pop(key), sign=-1)
+                    else:
+                        _pending[key] = liked
+            raise
+
+        with _lock:
+            for key, liked in batch.items():
+                del _in_flight[key]
+                _add_delta(key[0], liked, sign=-1)
+            _generation += 1
+        return len(batch)
+
+
+def flush(batch_size=None):
+    """Записывает в базу весь буфер. Возвращает количество применённых намерений."""
+    batch_size = batch_size or settings.LIKES_FLUSH_BATCH_SIZE
+    flushed = 0
+    while True:
+        batch_flushed = flush_batch(batch_size)
+        if not batch_flushed:
+            return flushed
+        flushed += batch_flushed
+
+
+def get_buffer_size():
+    with _lock:
+        return len(_pending) + len(_in_flight)
+
+
+flusher = PeriodicFlusher('likes-flusher', flush, settings.LIKES_FLUSH_INTERVAL)
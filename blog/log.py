@@ -0,0 +1,45 @@
+"""
+Обработчики и фильтры для LOGGING.
+
+QueueListenerHandler складывает записи в очередь, а пишет их в настоящие
+обработчики отдельный поток, поэтому поток запроса не ждёт диск и консоль.
+SamplingFilter пропускает только долю записей болтливых логгеров.
+"""
+import logging
+import random
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler со своим QueueListener.
+
+    handlers — ссылки вида cfg://handlers.file на обработчики из того же LOGGING,
+    dictConfig подставит вместо них уже настроенные объекты.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(SimpleQueue())
+        # Элементы списка из dictConfig превращаются в обработчики только при обращении по индексу
+        handlers = [handlers[index] for index in range(len(handlers))]
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def close(self):
+        # Дописываем то, что ещё лежит в очереди
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей ниже WARNING. Предупреждения и ошибки проходят всегда."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
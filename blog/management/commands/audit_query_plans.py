@@ -0,0 +1,153 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from blog import archive, fake_data, likes
+from blog.benchmarking import LOCAL_CACHES
+from blog.models import Post, Tag
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+SQL_PREVIEW_LENGTH = 300
+# Эти вьюхи отдают все строки таблицы, полный обход для них нормален
+FULL_SCAN_VIEWS = {'sitemap_section', 'api_export'}
+
+
+def get_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def classify(detail):
+    """Что плохого в строке плана: полный обход таблицы, обход индекса или временное B-дерево."""
+    if 'TEMP B-TREE' in detail:
+        return 'temp b-tree'
+    if not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail or 'CONSTANT ROW' in detail:
+        return None
+    if detail.startswith('SCAN (') or ' USING ' not in detail:
+        return 'full scan'
+    return 'index scan'
+
+
+class Command(BaseCommand):
+    help = (
+        'Открывает все страницы и API на временной базе с синтетическими данными, '
+        'выполняет EXPLAIN QUERY PLAN для каждого их SQL-запроса и печатает по '
+        'каждой вьюхе запросы, которые обходят таблицу целиком или сортируют во '
+        'временном B-дереве. С --strict падает на полных обходах таблиц там, где их быть не должно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000, help='Постов во временной базе')
+        parser.add_argument('--all', action='store_true', help='Печатать планы всех запросов, а не только плохих')
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Падать, если вьюха не из FULL_SCAN_VIEWS обходит таблицу целиком')
+
+    def get_pages(self):
+        post = Post.objects.fresh().first()
+        tag = Tag.objects.popular()[0]
+        year, month = archive.get_month(post.published_at)
+        search_word = post.title.split()[0]
+        return [
+            ('index', 'get', reverse('index')),
+            ('post_detail', 'get', reverse('post_detail', kwargs={'slug': post.slug})),
+            ('post_comments', 'get', reverse('post_comments', kwargs={'slug': post.slug})),
+            ('like_post', 'post', reverse('like_post', kwargs={'slug': post.slug})),
+            ('tag_filter', 'get', reverse('tag_filter', kwargs={'tag_title': tag.title})),
+            ('tag_feed', 'get', reverse('tag_feed', kwargs={'tag_title': tag.title, 'kind': 'rss'})),
+            ('feed', 'get', reverse('feed', kwargs={'kind': 'atom'})),
+            ('sitemap_index', 'get', reverse('sitemap_index')),
+            ('sitemap_section', 'get', reverse('sitemap_section', kwargs={'name': 'posts-1'})),
+            ('archive_year', 'get', reverse('archive_year', kwargs={'year': year})),
+            ('archive_month', 'get', reverse('archive_month', kwargs={'year': year, 'month': month})),
+            ('search', 'get', f'{reverse("search")}?q={search_word}'),
+            ('contacts', 'get', reverse('contacts')),
+            ('profiling_stats', 'get', reverse('profiling_stats')),
+            ('api_post_list', 'get', f'{reverse("api_post_list")}?tag={tag.title}'),
+            ('api_post_detail', 'get', reverse('api_post_detail', kwargs={'slug': post.slug})),
+            ('api_tag_list', 'get', reverse('api_tag_list')),
+            ('api_export', 'get', reverse('api_export')),
+            ('page_views_report', 'get', reverse('page_views_report')),
+        ]
+
+    def capture(self, client, method, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            # Лайк пишется в базу пачкой, её запросы тоже проверяем
+            likes.flush()
+        if response.status_code != 200:
+            raise CommandError(f'{url} ответил {response.status_code}')
+        return [query['sql'] for query in queries.captured_queries]
+
+    def audit(self, client):
+        report = {}
+        for view, method, url in self.get_pages():
+            statements = []
+            for sql in dict.fromkeys(self.capture(client, method, url)):
+                if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                    continue
+                plan = get_plan(sql)
+                problems = {classify(detail) for detail in plan} - {None}
+                statements.append({'sql': sql, 'plan': plan, 'problems': problems})
+            report[view] = statements
+        return report
+
+    def print_report(self, report, print_all):
+        for view, statements in report.items():
+            flagged = [statement for statement in statements if statement['problems']]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{view}: запросов {len(statements)}, с обходами и сортировками {len(flagged)}'
+            ))
+            for statement in statements if print_all else flagged:
+                sql = statement['sql']
+                if len(sql) > SQL_PREVIEW_LENGTH:
+                    sql = f'{sql[:SQL_PREVIEW_LENGTH]}…'
+                problems = ', '.join(sorted(statement['problems'])) or 'ok'
+                self.stdout.write(f'  [{problems}] {sql}')
+                for detail in statement['plan']:
+                    style = self.style.WARNING if classify(detail) else str
+                    self.stdout.write(style(f'      {detail}'))
+
+    # Реплики смотрят в рабочие файлы, а не во временную базу, просмотры страниц — не вьюха
+    @override_settings(DATABASE_REPLICA_WEIGHTS={}, PAGE_VIEWS_TRACKED_VIEWS=[], CACHES=LOCAL_CACHES)
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # У фонового потока лайков своё соединение, поэтому база — файл, а не память
+        with tempfile.TemporaryDirectory() as test_db_dir:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(test_db_dir, 'plans.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                posts = options['posts']
+                fake_data.generate(users=50, tags=30, posts=posts, likes=3 * posts, comments=3 * posts, seed=0)
+                staff = User.objects.create_user('plans-audit', is_staff=True)
+                client = Client()
+                client.force_login(staff)
+                report = self.audit(client)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        self.print_report(report, options['all'])
+        full_scans = [
+            view for view, statements in report.items()
+            if view not in FULL_SCAN_VIEWS and any('full scan' in statement['problems'] for statement in statements)
+        ]
+        if options['strict'] and full_scans:
+            raise CommandError(f'Полные обходы таблиц: {", ".join(full_scans)}')
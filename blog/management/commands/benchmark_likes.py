@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+
+from blog import fake_data, likes
+from blog.benchmarking import get_git_revision, measure_ms, summarize
+from blog.models import Post
+
+
+def get_likes():
+    return set(Post.likes.through.objects.values_list('post_id', 'user_id'))
+
+
+def like_sync(post, user_id, liked):
+    """Как лайкал бы обычный эндпоинт: сразу в базу, со всеми сигналами."""
+    if liked:
+        post.likes.add(user_id)
+    else:
+        post.likes.remove(user_id)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает лайки, которые сразу пишутся в базу, с лайками через буфер: '
+        'время клика и время записи пачек. Проверяет, что после сброса буфера '
+        'лайки и likes_count совпадают с ожидаемыми. Работает на временной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clicks', type=int, default=2000, help='Кликов по сердечку в каждом режиме')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def build_clicks(self, rnd, amount):
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        user_ids = list(User.objects.values_list('id', flat=True))
+        # Повторные клики одного пользователя по одному посту должны схлопываться
+        users = rnd.sample(user_ids, min(len(user_ids), 200))
+        return [(rnd.choice(post_ids), rnd.choice(users), rnd.random() < 0.7) for _ in range(amount)]
+
+    def check_result(self, mode, initial_likes, clicks):
+        expected = set(initial_likes)
+        for post_id, user_id, liked in clicks:
+            if liked:
+                expected.add((post_id, user_id))
+            else:
+                expected.discard((post_id, user_id))
+        if get_likes() != expected:
+            raise CommandError(f'{mode}: лайки в базе не совпадают с ожидаемыми')
+        wrong_counters = (
+            Post.objects.with_counts(exact=True)
+            .exclude(likes_amount=F('likes_count'))
+            .count()
+        )
+        if wrong_counters:
+            raise CommandError(f'{mode}: likes_count расходится с лайками у {wrong_counters} постов')
+
+    def benchmark_sync(self, clicks):
+        posts = Post.objects.in_bulk()
+        initial_likes = get_likes()
+        timings = [measure_ms(like_sync, posts[post_id], user_id, liked) for post_id, user_id, liked in clicks]
+        self.check_result('sync', initial_likes, clicks)
+        return {'click': summarize(timings), 'total_ms': round(sum(timings), 1)}
+
+    def benchmark_buffered(self, clicks):
+        initial_likes = get_likes()
+        timings = [measure_ms(likes.set_like, post_id, user_id, liked) for post_id, user_id, liked in clicks]
+        buffered = likes.get_buffer_size()
+        flush_ms = measure_ms(likes.flush)
+        if likes.get_buffer_size() or any(likes.get_pending_delta(post_id) for post_id, _, _ in clicks):
+            raise CommandError('buffered: после сброса в буфере остались лайки')
+        self.check_result('buffered', initial_likes, clicks)
+        return {
+            'click': summarize(timings),
+            'flush_ms': round(flush_ms, 1),
+            'total_ms': round(sum(timings) + flush_ms, 1),
+            # Фоновый поток мог успеть записать часть пачек во время кликов
+            'buffered_before_flush': buffered,
+        }
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        # У фонового потока лайков своё соединение, поэтому база — файл, а не память.
+        # Его файлы WAL остаются открытыми, каталог удаляется целиком
+        with tempfile.TemporaryDirectory() as test_db_dir:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(test_db_dir, 'likes.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                fake_data.generate(users=1000, tags=10, posts=200, likes=2000, comments=200, seed=options['seed'])
+                modes = {
+                    'sync': self.benchmark_sync(self.build_clicks(rnd, options['clicks'])),
+                    'buffered': self.benchmark_buffered(self.build_clicks(rnd, options['clicks'])),
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'revision': get_git_revision(),
+            'clicks': options['clicks'],
+            'modes': modes,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
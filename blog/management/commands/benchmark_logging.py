@@ -0,0 +1,158 @@
+import copy
+import json
+import logging.config
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from blog.benchmarking import get_git_revision, measure_ms, summarize
+from blog.models import Post, Tag
+
+
+class SlowStream:
+    """/dev/null, каждая запись в который занимает latency_ms: медленный терминал или сборщик логов."""
+
+    def __init__(self, stream, latency_ms):
+        self.stream = stream
+        self.latency = latency_ms / 1000
+
+    def write(self, text):
+        time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def get_sync_logging(log_dir, console_stream):
+    """Прежняя настройка: всё от DEBUG синхронно в консоль и файл, включая SQL."""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {
+                'level': 'DEBUG',
+                'class': 'logging.StreamHandler',
+                'stream': console_stream,
+            },
+            'file': {
+                'level': 'DEBUG',
+                'class': 'logging.FileHandler',
+                'filename': os.path.join(log_dir, 'sync.log'),
+            },
+        },
+        'loggers': {
+            '': {
+                'handlers': ['console', 'file'],
+                'level': 'DEBUG',
+                'propagate': True,
+            },
+            # Django по умолчанию поднимает уровень логгера django до INFO
+            'django.db.backends': {
+                'level': 'DEBUG',
+            },
+        },
+    }
+
+
+def get_queue_logging(log_dir, console_stream, sql_level, sql_sample_rate):
+    config = copy.deepcopy(settings.LOGGING)
+    config['handlers']['console']['stream'] = console_stream
+    config['handlers']['file']['filename'] = os.path.join(log_dir, 'queue.log')
+    config['loggers']['django.db.backends']['level'] = sql_level
+    config['filters']['sample_sql']['rate'] = sql_sample_rate
+    return config
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время ответа страниц с прежним синхронным логированием SQL в консоль и файл '
+        'и с логированием через очередь: всего SQL, доли SQL и настройками по умолчанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Запросов на каждую настройку')
+        parser.add_argument(
+            '--write-latency-ms',
+            type=float,
+            default=0.5,
+            help='Сколько занимает одна запись в консоль, 0 — мгновенно')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def build_urls(self, rnd, amount):
+        post_slugs = list(Post.objects.fresh().values_list('slug', flat=True)[:1000])
+        tag_titles = [tag.title for tag in Tag.objects.popular()]
+        if not post_slugs or not tag_titles:
+            raise CommandError('База пуста, сначала запустите generate_fake_data')
+        pages = [
+            lambda: reverse('index'),
+            lambda: reverse('post_detail', kwargs={'slug': rnd.choice(post_slugs)}),
+            lambda: reverse('tag_filter', kwargs={'tag_title': rnd.choice(tag_titles)}),
+        ]
+        return [pages[number % len(pages)]() for number in range(amount)]
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} ответил {response.status_code}')
+
+    def benchmark_config(self, config, client, urls):
+        # dictConfig не снимает с логгеров фильтры, навешенные прошлой настройкой
+        for logger_name in settings.LOGGING['loggers']:
+            logging.getLogger(logger_name).filters.clear()
+        logging.config.dictConfig(config)
+        for url in urls[:5]:
+            self.request(client, url)
+        return summarize([measure_ms(self.request, client, url) for url in urls])
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        setup_test_environment()
+        # Консоль в замерах — /dev/null с искусственной задержкой, чтобы не зависеть от терминала
+        devnull = open(os.devnull, 'w')
+        console_stream = SlowStream(devnull, options['write_latency_ms'])
+        connection.force_debug_cursor = True
+        try:
+            with tempfile.TemporaryDirectory() as log_dir:
+                client = Client()
+                urls = self.build_urls(rnd, options['requests'])
+                configs = {
+                    'sync_all_sql': get_sync_logging(log_dir, console_stream),
+                    'queue_all_sql': get_queue_logging(log_dir, console_stream, 'DEBUG', 1),
+                    'queue_sampled_sql': get_queue_logging(
+                        log_dir, console_stream, 'DEBUG', settings.LOG_SQL_SAMPLE_RATE),
+                    'queue_default': get_queue_logging(
+                        log_dir, console_stream, settings.LOG_SQL_LEVEL, settings.LOG_SQL_SAMPLE_RATE),
+                }
+                results = {
+                    name: self.benchmark_config(config, client, urls)
+                    for name, config in configs.items()
+                }
+                # Закрываем файлы логов до удаления каталога
+                logging.config.dictConfig(settings.LOGGING)
+        finally:
+            connection.force_debug_cursor = False
+            devnull.close()
+            teardown_test_environment()
+
+        report = {
+            'revision': get_git_revision(),
+            'posts': Post.objects.count(),
+            'write_latency_ms': options['write_latency_ms'],
+            'configs': results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,78 @@
+import json
+import math
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import related
+from blog.benchmarking import get_git_revision, measure_ms, summarize
+from blog.models import Post
+
+
+def rank_brute_force(post_id, vectors, popularity, limit):
+    """Эталон: косинус со всеми постами подряд."""
+    tags = vectors[post_id]
+    scored = [
+        (-len(tags & other_tags) / math.sqrt(len(tags) * len(other_tags)), popularity[other_id], other_id)
+        for other_id, other_tags in vectors.items()
+        if other_id != post_id and tags & other_tags
+    ]
+    return [other_id for _, _, other_id in sorted(scored)[:limit]]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет подбор похожих постов на текущей базе: загрузку тегов, полную '
+        'пересборку и пересчёт отдельных постов. Сверяет выборку постов с '
+        'перебором всех пар. В базу ничего не пишет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Сколько раз повторить полную пересборку')
+        parser.add_argument('--sample', type=int, default=50, help='Постов для пересчёта по одному и сверки')
+        parser.add_argument('--limit', type=int, default=settings.RELATED_POSTS_AMOUNT)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        load_timings = []
+        compute_timings = []
+        for _ in range(options['runs']):
+            load_timings.append(measure_ms(related.load_tag_vectors))
+            vectors, popular_ids = related.load_tag_vectors()
+            compute_timings.append(measure_ms(related.compute, vectors, popular_ids, limit))
+        if not vectors:
+            raise CommandError('В базе нет постов с тегами')
+
+        related_posts = related.compute(vectors, popular_ids, limit)
+        sample = random.Random(options['seed']).sample(list(vectors), min(options['sample'], len(vectors)))
+        update_timings = [measure_ms(related.compute, vectors, popular_ids, limit, [post_id]) for post_id in sample]
+
+        popularity = {post_id: place for place, post_id in enumerate(popular_ids)}
+        mismatched = [
+            post_id for post_id in sample
+            if related_posts[post_id] != rank_brute_force(post_id, vectors, popularity, limit)
+        ]
+        if mismatched:
+            raise CommandError(f'Списки расходятся с перебором у постов: {mismatched}')
+
+        report = {
+            'revision': get_git_revision(),
+            'posts': Post.objects.count(),
+            'posts_with_tags': len(vectors),
+            'distinct_tag_sets': len(set(vectors.values())),
+            'limit': limit,
+            'load_tags': summarize(load_timings),
+            'full_rebuild': summarize(compute_timings),
+            # Без загрузки тегов: её update_posts() платит один раз на транзакцию
+            'single_post': summarize(update_timings),
+            'checked_posts': len(sample),
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
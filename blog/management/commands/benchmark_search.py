@@ -0,0 +1,65 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import search
+from blog.benchmarking import get_git_revision, measure_ms, summarize
+from blog.fake_data import VOCABULARY
+from blog.models import Post
+
+# Границы рангов слов в словаре генератора: частые, средние и редкие
+FREQUENCY_BANDS = {
+    'frequent': (0, 20),
+    'medium': (200, 2000),
+    'rare': (5000, len(VOCABULARY)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск через FTS5 с наивным icontains на первой странице результатов. '
+        'Базу стоит заранее наполнить: generate_fake_data --posts 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=30, help='Запросов на каждую группу слов')
+        parser.add_argument('--per-page', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def run_fts(self, query, per_page):
+        match_query = search.build_match_query(query)
+        rows = search.search_ids(match_query, limit=per_page)
+        post_ids = [post_id for post_id, _ in rows]
+        search.get_snippets(match_query, post_ids)
+        list(Post.objects.filter(id__in=post_ids))
+
+    def run_naive(self, query, per_page):
+        list(search.naive_search(query).fresh()[:per_page])
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс недоступен, примените миграции')
+        rnd = random.Random(options['seed'])
+        per_page = options['per_page']
+
+        bands = {}
+        for band, (start, end) in FREQUENCY_BANDS.items():
+            queries = [VOCABULARY[rnd.randrange(start, end)] for _ in range(options['queries'])]
+            bands[band] = {
+                'fts5': summarize([measure_ms(self.run_fts, query, per_page) for query in queries]),
+                'icontains': summarize([measure_ms(self.run_naive, query, per_page) for query in queries]),
+            }
+
+        report = {
+            'revision': get_git_revision(),
+            'posts': Post.objects.count(),
+            'bands': bands,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,98 @@
+import json
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, engines
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from blog.benchmarking import get_git_revision, measure_ms, summarize
+from blog.models import Post, Tag
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def get_template_ms(response):
+    """Время рендеринга шаблонов из заголовка Server-Timing, который ставит ProfilingMiddleware."""
+    for metric in response['Server-Timing'].split(','):
+        name, *params = metric.strip().split(';')
+        if name == 'tpl':
+            return float(params[0].split('=')[1])
+    raise CommandError('В Server-Timing нет времени шаблонов')
+
+
+class Command(BaseCommand):
+    help = (
+        'Меряет время рендеринга index.html, posts-list.html и post-details.html '
+        'с пустым и заполненным кэшем карточек, а также время разбора шаблонов '
+        'с кэширующим загрузчиком и без него'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Рендеров на каждый шаблон и режим')
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def build_urls(self):
+        post = Post.objects.fresh().first()
+        tag = Tag.objects.popular().first()
+        if post is None or tag is None:
+            raise CommandError('База пуста, сначала запустите generate_fake_data')
+        return {
+            'index.html': reverse('index'),
+            'posts-list.html': reverse('tag_filter', kwargs={'tag_title': tag.title}),
+            'post-details.html': reverse('post_detail', kwargs={'slug': post.slug}),
+        }
+
+    def render(self, client, url, clear_fragments):
+        if clear_fragments:
+            caches['template_fragments'].clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} ответил {response.status_code}')
+        return get_template_ms(response)
+
+    def measure_parsing(self, template_name, amount):
+        base_engine = engines['django'].engine
+        engine_options = {'dirs': base_engine.dirs, 'libraries': base_engine.libraries}
+        plain = Engine(loaders=TEMPLATE_LOADERS, **engine_options)
+        cached = Engine(loaders=[('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)], **engine_options)
+        return {
+            'parse_plain': summarize([measure_ms(plain.get_template, template_name) for _ in range(amount)]),
+            'parse_cached': summarize([measure_ms(cached.get_template, template_name) for _ in range(amount)]),
+        }
+
+    @override_settings(PROFILING_ENABLED=True)
+    def handle(self, *args, **options):
+        amount = options['requests']
+        setup_test_environment()
+        try:
+            client = Client()
+            templates = {}
+            for template_name, url in self.build_urls().items():
+                # Прогрев сайдбара и кэширующего загрузчика
+                self.render(client, url, clear_fragments=False)
+                cold = [self.render(client, url, clear_fragments=True) for _ in range(amount)]
+                warm = [self.render(client, url, clear_fragments=False) for _ in range(amount)]
+                templates[template_name] = {
+                    'render_cold_fragments': summarize(cold),
+                    'render_warm_fragments': summarize(warm),
+                    **self.measure_parsing(template_name, amount),
+                }
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'revision': get_git_revision(),
+            'posts': Post.objects.count(),
+            'templates': templates,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
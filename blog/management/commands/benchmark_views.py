@@ -0,0 +1,150 @@
+import json
+import random
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from blog.benchmarking import LOCAL_CACHES, get_git_revision, measure_ms, summarize
+from blog.models import Post, Tag
+
+
+def get_value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, bytes):
+        return len(value)
+    return 8
+
+
+class FetchedBytesCounter:
+    """
+    Считает байты в строках, которые страница прочитала из базы. row_factory
+    соединения sqlite3 видит каждую строку результата, повторять запросы не нужно.
+    """
+
+    def __init__(self):
+        self.fetched_bytes = 0
+        self._connections = []
+
+    def count_row(self, cursor, row):
+        self.fetched_bytes += sum(get_value_size(value) for value in row)
+        return row
+
+    def __enter__(self):
+        # Только уже открытые соединения: прогрев открыл все, с которых читают страницы
+        for db_connection in connections.all():
+            raw_connection = db_connection.connection
+            if db_connection.vendor == 'sqlite' and raw_connection is not None:
+                self._connections.append((raw_connection, raw_connection.row_factory))
+                raw_connection.row_factory = self.count_row
+        return self
+
+    def __exit__(self, *exc_info):
+        for raw_connection, row_factory in self._connections:
+            raw_connection.row_factory = row_factory
+        self._connections = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Гоняет index, post_detail, tag_filter и contacts через тестовый клиент и '
+        'печатает в JSON перцентили времени ответа, число запросов, объём '
+        'прочитанных из базы данных и пик памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Запросов на каждую страницу')
+        parser.add_argument('--warmup', type=int, default=5, help='Прогревочных запросов, не попадают в замеры')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта, по умолчанию stdout')
+
+    def build_urls(self, rnd, amount):
+        post_slugs = list(Post.objects.fresh().values_list('slug', flat=True)[:1000])
+        tag_titles = [tag.title for tag in Tag.objects.popular()]
+        if not post_slugs or not tag_titles:
+            raise CommandError('База пуста, сначала запустите generate_fake_data')
+        return {
+            'index': [reverse('index')] * amount,
+            'post_detail': [
+                reverse('post_detail', kwargs={'slug': rnd.choice(post_slugs)}) for _ in range(amount)
+            ],
+            'tag_filter': [
+                reverse('tag_filter', kwargs={'tag_title': rnd.choice(tag_titles)}) for _ in range(amount)
+            ],
+            'contacts': [reverse('contacts')] * amount,
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} ответил {response.status_code}')
+
+    def benchmark_view(self, client, urls, warmup):
+        for url in urls[:warmup]:
+            self.request(client, url)
+
+        timings, query_counts, fetched_bytes = [], [], []
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                timings.append(measure_ms(self.request, client, url))
+            query_counts.append(len(queries))
+        for url in urls[:warmup or 1]:
+            with FetchedBytesCounter() as counter:
+                self.request(client, url)
+            fetched_bytes.append(counter.fetched_bytes)
+
+        # Память меряем отдельным проходом: tracemalloc заметно замедляет запросы
+        tracemalloc.start()
+        for url in urls[:warmup or 1]:
+            self.request(client, url)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            **summarize(timings),
+            'queries_max': max(query_counts),
+            'queries_avg': round(sum(query_counts) / len(query_counts), 2),
+            'fetched_kb': round(max(fetched_bytes) / 1024, 1),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    # Замеры идут на рабочей базе: просмотры страниц не записываем, кэш сайта не трогаем
+    @override_settings(PAGE_VIEWS_TRACKED_VIEWS=[], CACHES=LOCAL_CACHES)
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        setup_test_environment()
+        try:
+            # Если страница всё же что-то запишет, транзакция это откатит
+            with transaction.atomic():
+                client = Client()
+                urls = self.build_urls(rnd, options['requests'])
+                views = {
+                    view: self.benchmark_view(client, view_urls, options['warmup'])
+                    for view, view_urls in urls.items()
+                }
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'revision': get_git_revision(),
+            'posts': Post.objects.count(),
+            'views': views,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
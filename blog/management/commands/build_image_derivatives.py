@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from blog import images
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии и WebP для картинок постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Число процессов, по умолчанию по числу ядер')
+        parser.add_argument('--force', action='store_true', help='Пересоздать описание копий у всех постов')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('id', 'image', 'image_derivatives')
+        if not options['force']:
+            posts = [post for post in posts.iterator() if images.needs_derivatives(post)]
+        post_ids_by_image = {}
+        for post in posts:
+            post_ids_by_image.setdefault(post.image.name, []).append(post.id)
+
+        # Дочерние процессы работают только с файлами, соединения с базой им не нужны
+        connections.close_all()
+
+        built, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(images.build_derivatives, image_name): image_name
+                for image_name in post_ids_by_image
+            }
+            for future in as_completed(futures):
+                derivatives = future.result()
+                if derivatives is None:
+                    failed += 1
+                    continue
+                Post.objects.filter(id__in=post_ids_by_image[futures[future]]).update(
+                    image_derivatives=derivatives,
+                    updated_at=timezone.now(),
+                )
+                built += 1
+
+        self.stdout.write(f'Обработано картинок: {built}, не удалось прочитать: {failed}')
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from blog import fake_data
+from blog.benchmarking import measure_ms, summarize
+from blog.models import Post
+
+
+def read_posts():
+    list(Post.objects.fresh().with_counts().select_related('author')[:20])
+    list(Post.objects.popular()[:5])
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что чтение постов не ждёт записи лайков: пока один поток '
+        'лайкает посты в долгих транзакциях, другие читают ленту. '
+        'Работает на временной файловой базе, падает с ошибкой при нарушениях'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Сколько потоков читают')
+        parser.add_argument('--transactions', type=int, default=20, help='Сколько транзакций с лайками сделать')
+        parser.add_argument(
+            '--hold-ms',
+            type=int,
+            default=50,
+            help='Сколько писатель держит транзакцию открытой после записи')
+        parser.add_argument(
+            '--max-read-ms',
+            type=float,
+            default=100,
+            help='Во сколько миллисекунд должно уложиться самое долгое чтение')
+
+    def write_likes(self, user_ids, options, errors):
+        try:
+            posts = list(Post.objects.order_by('?')[:options['transactions']])
+            batch_size = max(len(user_ids) // 2, 1)
+            for number, post in enumerate(posts):
+                with transaction.atomic():
+                    start = number * batch_size % len(user_ids)
+                    post.likes.add(*user_ids[start:start + batch_size])
+                    time.sleep(options['hold_ms'] / 1000)
+        except Exception as error:
+            errors.append(f'Писатель: {error}')
+        finally:
+            connection.close()
+
+    def read_until_done(self, done, timings, errors):
+        try:
+            while not done.is_set():
+                timings.append(measure_ms(read_posts))
+        except Exception as error:
+            errors.append(f'Читатель: {error}')
+        finally:
+            connection.close()
+
+    def run_load(self, options):
+        user_ids = list(User.objects.values_list('id', flat=True))
+        done = threading.Event()
+        timings = []
+        errors = []
+        readers = [
+            threading.Thread(target=self.read_until_done, args=(done, timings, errors))
+            for _ in range(options['readers'])
+        ]
+        writer = threading.Thread(target=self.write_likes, args=(user_ids, options, errors))
+
+        for reader in readers:
+            reader.start()
+        writer.start()
+        writer.join()
+        done.set()
+        for reader in readers:
+            reader.join()
+        return timings, errors
+
+    def handle(self, *args, **options):
+        # WAL не работает с базой в памяти, поэтому тестовая база — временный файл
+        test_db_path = os.path.join(tempfile.mkdtemp(), 'concurrency.sqlite3')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = test_db_path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            fake_data.generate(users=2000, tags=10, posts=500, likes=1000, comments=500, seed=1)
+            connection.close()
+            timings, errors = self.run_load(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            os.rmdir(os.path.dirname(test_db_path))
+
+        if not timings:
+            errors.append('Читатели не успели сделать ни одного запроса')
+        else:
+            stats = summarize(timings)
+            self.stdout.write(
+                f'journal_mode={journal_mode}, чтений: {stats["runs"]}, '
+                f'p50 {stats["p50_ms"]} мс, p99 {stats["p99_ms"]} мс, максимум {max(timings):.1f} мс'
+            )
+            if max(timings) > options['max_read_ms']:
+                errors.append(
+                    f'Чтение заняло {max(timings):.1f} мс при допустимых {options["max_read_ms"]} мс: '
+                    'читатели ждут писателя'
+                )
+
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Чтение не блокируется записью лайков'))
@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog import pageviews
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает поминутные счётчики просмотров старше --days дней в дневные'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Сколько последних дней хранить поминутно')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        removed = pageviews.compact(before)
+        self.stdout.write(f'Строк счётчиков стало меньше на {removed}')
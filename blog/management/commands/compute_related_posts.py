@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие посты по общим тегам. Без --posts пересобирает '
+        'таблицу целиком — после массовой загрузки постов и раз в сутки, чтобы '
+        'учесть новые посты и лайки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            nargs='+',
+            help='Пересчитать только эти посты и посты, в списках которых они стоят')
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.RELATED_POSTS_AMOUNT,
+            help='Сколько похожих постов хранить у поста')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        if options['posts']:
+            started_at = time.perf_counter()
+            updated = related.update_posts(options['posts'], limit)
+            self.stdout.write(f'Пересчитано постов: {updated} за {time.perf_counter() - started_at:.1f} с')
+            return
+
+        started_at = time.perf_counter()
+        vectors, popular_ids = related.load_tag_vectors()
+        loaded_at = time.perf_counter()
+        related_posts = related.compute(vectors, popular_ids, limit)
+        computed_at = time.perf_counter()
+        related.store(related_posts, replace_all=True)
+        stored_at = time.perf_counter()
+        self.stdout.write(
+            f'Постов: {len(related_posts)}, разных наборов тегов: {len(set(vectors.values()))}\n'
+            f'Загрузка тегов: {loaded_at - started_at:.1f} с, '
+            f'подбор: {computed_at - loaded_at:.1f} с, '
+            f'запись: {stored_at - computed_at:.1f} с'
+        )
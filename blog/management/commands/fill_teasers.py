@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from blog.management.commands.recount_counters import iter_id_batches
+from blog.models import TEASER_LENGTH, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет начало текста у постов пачками. Запустите после загрузки '
+        'постов в обход моделей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов обновлять за одну транзакцию')
+
+    def handle(self, *args, **options):
+        posts_processed = 0
+        for ids in iter_id_batches(Post.objects.all(), options['batch_size']):
+            # Текст режется в базе, в Python он не читается. updated_at сдвигаем,
+            # чтобы закэшированные карточки с пустым началом текста устарели
+            teaser = Substr('text', 1, TEASER_LENGTH)
+            with transaction.atomic():
+                posts_processed += (
+                    Post.objects.filter(id__in=ids)
+                    .exclude(teaser=teaser)
+                    .update(teaser=teaser, updated_at=timezone.now())
+                )
+        self.stdout.write(f'Посты: заполнено {posts_processed}')
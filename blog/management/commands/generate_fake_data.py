@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import fake_data
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими пользователями, постами, тегами, лайками и комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--likes', type=int, default=100000, help='Всего лайков на новые посты')
+        parser.add_argument('--comments', type=int, default=50000, help='Всего комментариев к новым постам')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для повторяемых данных')
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        post_ids = fake_data.generate(
+            users=options['users'],
+            tags=options['tags'],
+            posts=options['posts'],
+            likes=options['likes'],
+            comments=options['comments'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(f'Создано постов: {len(post_ids)} за {elapsed:.1f} с')
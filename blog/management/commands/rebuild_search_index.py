@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс доступен только на SQLite с FTS5, примените миграции')
+        search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write('Поисковый индекс пересобран')
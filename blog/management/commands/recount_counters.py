@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import archive, leaderboard, sidebar
+from blog.models import Post, Tag
+
+
+def iter_id_batches(queryset, batch_size):
+    last_id = 0
+    while True:
+        ids = list(
+            queryset
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики лайков, комментариев, постов по тегам и месяцам архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк обновлять за одну транзакцию')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        posts_processed = 0
+        for ids in iter_id_batches(Post.objects.all(), batch_size):
+            with transaction.atomic():
+                batch = Post.objects.filter(id__in=ids)
+                batch.recount_likes()
+                batch.recount_comments()
+            posts_processed += len(ids)
+        leaderboard.invalidate()
+        self.stdout.write(f'Посты: пересчитано {posts_processed}')
+
+        tags_processed = 0
+        for ids in iter_id_batches(Tag.objects.all(), batch_size):
+            with transaction.atomic():
+                Tag.objects.filter(id__in=ids).recount_posts()
+            tags_processed += len(ids)
+        self.stdout.write(f'Теги: пересчитано {tags_processed}')
+
+        archive.rebuild()
+        sidebar.invalidate()
+        self.stdout.write('Архив пересобран')
@@ -0,0 +1,58 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_database(source_path, target_path, busy_timeout):
+    # Backup API копирует согласованный снимок, не останавливая запись в источник
+    source = sqlite3.connect(source_path, timeout=busy_timeout)
+    target = sqlite3.connect(target_path, timeout=busy_timeout)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в файлы реплик. '
+        'Заменяет настоящую репликацию при локальной разработке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='aliases',
+            help='Какую реплику обновить, по умолчанию все')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять копирование раз в столько секунд, пока команду не остановят')
+
+    def sync(self, aliases):
+        source_path = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        busy_timeout = settings.SQLITE_PRAGMAS['busy_timeout'] / 1000
+        for alias in aliases:
+            started_at = time.perf_counter()
+            copy_database(source_path, connections[alias].settings_dict['NAME'], busy_timeout)
+            self.stdout.write(f'{alias}: скопировано за {time.perf_counter() - started_at:.2f} с')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or list(settings.DATABASE_REPLICA_WEIGHTS)
+        if not aliases:
+            raise CommandError('Реплики не настроены, задайте DATABASE_REPLICA_FILEPATHS')
+        for alias in aliases:
+            if alias not in settings.DATABASE_REPLICA_WEIGHTS:
+                raise CommandError(f'{alias} не реплика')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: копировать можно только SQLite-базы')
+
+        self.sync(aliases)
+        while options['interval']:
+            time.sleep(options['interval'])
+            self.sync(aliases)
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(queryset, field):
+    counts = (
+        queryset
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Tag = apps.get_model('blog', 'Tag')
+    Comment = apps.get_model('blog', 'Comment')
+    Post.objects.update(
+        likes_count=count_related(Post.likes.through.objects, 'post'),
+        comments_count=count_related(Comment.objects, 'post'),
+    )
+    Tag.objects.update(posts_count=count_related(Post.tags.through.objects, 'tag'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_alter_comment_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='posts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='published_at',
+            field=models.DateTimeField(db_index=True, verbose_name='Дата и время публикации'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_post_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'published_at'], name='comment_post_published_at_idx'),
+        ),
+    ]
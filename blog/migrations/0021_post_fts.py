@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:05
+
+from django.db import DatabaseError, migrations
+
+CREATE_FTS_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts '
+    "USING fts5(title, text, comments, tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_FTS_TABLE)
+    except DatabaseError:
+        # SQLite собран без FTS5 — поиск будет работать через icontains
+        return
+    schema_editor.execute(
+        "INSERT INTO blog_post_fts (rowid, title, text, comments) "
+        "SELECT id, title, text, '' FROM blog_post"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS blog_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_comment_post_published_at_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
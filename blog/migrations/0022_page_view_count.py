@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageViewCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=200, verbose_name='Адрес страницы')),
+                ('minute', models.DateTimeField(verbose_name='Минута')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='page_views', to='blog.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'просмотры страницы',
+                'verbose_name_plural': 'просмотры страниц',
+                'indexes': [models.Index(fields=['minute'], name='page_view_minute_idx')],
+                'constraints': [models.UniqueConstraint(fields=('path', 'minute'), name='page_view_path_minute_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:08
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def fill_archive(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+    months = (
+        Post.objects
+        .annotate(published_month=TruncMonth('published_at'))
+        .order_by()
+        .values('published_month')
+        .annotate(posts_count=Count('id'))
+    )
+    ArchiveMonth.objects.bulk_create([
+        ArchiveMonth(
+            year=row['published_month'].year,
+            month=row['published_month'].month,
+            posts_count=row['posts_count'],
+        )
+        for row in months
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_page_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Год')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Месяц')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'месяц архива',
+                'verbose_name_plural': 'месяцы архива',
+                'ordering': ['-year', '-month'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month'), name='archive_month_year_month_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_archive, migrations.RunPython.noop),
+    ]
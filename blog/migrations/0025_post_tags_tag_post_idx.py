@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+from django.db import migrations
+
+# Связи постов и тегов создаёт ManyToManyField, в Meta индекс для них не описать.
+# С (tag_id, post_id) страница тега и подсчёт постов у тега читают только индекс
+CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS post_tags_tag_post_idx ON blog_post_tags (tag_id, post_id)'
+DROP_INDEX = 'DROP INDEX IF EXISTS post_tags_tag_post_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0024_related_post'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:25
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+
+def fill_teasers(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(teaser=Substr('text', 1, 200))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0025_post_tags_tag_post_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='teaser',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Начало текста'),
+        ),
+        migrations.RunPython(fill_teasers, migrations.RunPython.noop),
+    ]
@@ -1,63 +1,161 @@
+import datetime
+
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
-from django.db.models import Count, Prefetch
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Сколько первых символов текста показывается в карточке поста
+TEASER_LENGTH = 200
+# С какого количества постов у тега страницу тега выгоднее собирать обходом индекса по дате
+TAG_INDEX_WALK_MIN_POSTS = 1000
+
+
+def count_related(queryset, field):
+    """Коррелированный подзапрос с количеством строк queryset, ссылающихся на внешний pk."""
+    counts = (
+        queryset
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def get_month_range(year, month, months=1):
+    """Начало месяца и начало месяца через months месяцев в текущем часовом поясе."""
+    end_year, end_month = divmod(month - 1 + months, 12)
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + end_year, end_month + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
 
 
 class PostQuerySet(models.QuerySet):
     def year(self, year):
-        posts_at_year = self.filter(published_at__year=year).order_by('published_at')
+        # Диапазон, а не published_at__year: извлечение года из даты не даёт использовать индекс
+        start, end = get_month_range(year, 1, months=12)
+        posts_at_year = self.filter(published_at__gte=start, published_at__lt=end).order_by('published_at')
         return posts_at_year
 
+    def month(self, year, month):
+        start, end = get_month_range(year, month)
+        return self.filter(published_at__gte=start, published_at__lt=end).order_by('published_at')
+
     def popular(self):
-        return self.annotate(like_count=Count('likes', distinct=False)).order_by('-like_count')
+        return self.order_by('-likes_count', '-id')
+
+    def top_popular(self, limit=5):
+        """
+        Топ-K популярных постов без сортировки всей таблицы.
+
+        Id берутся из лидерборда, из базы читается ровно limit строк. Для
+        отфильтрованного queryset в ответ попадут только посты из глобального топа.
+        """
+        from blog import leaderboard
+
+        post_ids = leaderboard.get_top_post_ids(limit)
+        if post_ids is None:
+            return list(self.popular()[:limit])
 
-    def fetch_with_comments_count(self):
+        # Порядок задаёт лидерборд, сортировка по дате публикации не нужна
+        posts_by_id = self.filter(id__in=post_ids).order_by().in_bulk()
+        return [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+    def fresh(self):
+        return self.order_by('-published_at', '-id')
+
+    def with_tag(self, tag):
         """
-        Почему это лучше, чем обычный annotate:
-        - Мы выполняем один запрос для всех постов, а не для каждого по отдельности.
-        - Результат преобразуется в список, что удобно для использования в шаблонах.
+        Посты с тегом tag, план запроса выбирается по хранимому posts_count.
+
+        JOIN с таблицей связей читает все посты тега и сортирует их во временном
+        B-дереве: у тега с 40 000 постов это 300 мс на страницу. Для больших тегов
+        выгоднее идти по индексу (published_at, id) и проверять тег по индексу
+        (post_id, tag_id) — нужные строки находятся почти сразу. У редких тегов
+        такой обход прошёл бы полтаблицы, им остаётся JOIN.
+        """
+        if tag.posts_count < TAG_INDEX_WALK_MIN_POSTS:
+            return self.filter(tags=tag)
+        post_tags = Post.tags.through.objects.filter(post_id=OuterRef('pk'), tag_id=tag.id)
+        return self.filter(Exists(post_tags))
+
+    def with_counts(self, exact=False):
         """
-        posts = list(self)
+        Добавляет likes_amount и comments_amount.
 
-        post_ids = [post.id for post in posts]
+        По умолчанию это хранимые счётчики. С exact=True количество считается
+        коррелированными подзапросами: два Count по лайкам и комментариям в одном
+        запросе перемножают строки JOIN'ов и дают неверный результат.
+        """
+        if exact:
+            return self.annotate(
+                likes_amount=count_related(Post.likes.through.objects, 'post'),
+                comments_amount=count_related(Comment.objects, 'post'),
+            )
+        return self.annotate(likes_amount=F('likes_count'), comments_amount=F('comments_count'))
 
-        comments_counts = (
-            Post.objects
-            .filter(id__in=post_ids)
-            .annotate(comments_count=Count('comments'))
-            .values('id', 'comments_count')
+    def recount_likes(self):
+        return self.update(
+            likes_count=count_related(Post.likes.through.objects, 'post'),
+            updated_at=timezone.now(),
         )
 
-        count_for_id = {item['id']: item['comments_count'] for item in comments_counts}
+    def recount_comments(self):
+        return self.update(
+            comments_count=count_related(Comment.objects, 'post'),
+            updated_at=timezone.now(),
+        )
 
-        for post in posts:
-            post.comments_count = count_for_id.get(post.id, 0)
-        return posts
+    def touch(self):
+        return self.update(updated_at=timezone.now())
 
-    def fresh(self):
-        return self.order_by('-published_at')
+    def most_viewed(self, since=None):
+        """Посты по убыванию просмотров из поминутных счётчиков PageViewCount, с since — только за этот период."""
+        if since is None:
+            viewed = self.filter(page_views__isnull=False)
+        else:
+            viewed = self.filter(page_views__minute__gte=since)
+        return viewed.annotate(views_amount=Sum('page_views__views')).order_by('-views_amount', '-id')
 
 
 class TagQuerySet(models.QuerySet):
     def popular(self):
-        return self.annotate(posts_count=Count('posts')).order_by('-posts_count')[:5]
+        return self.order_by('-posts_count')[:5]
 
     def prefetch_with_post_count(self):
         return Prefetch(
                 'tags',
-                queryset=Tag.objects.annotate(posts_count=Count('posts')),
+                queryset=Tag.objects.all(),
                 to_attr='annotated_tags',
             )
 
+    def recount_posts(self):
+        return self.update(posts_count=count_related(Post.tags.through.objects, 'tag'))
+
 
 
 class Post(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     text = models.TextField('Текст')
+    # Карточкам нужен только он, поэтому списки постов не читают text
+    teaser = models.CharField(
+        'Начало текста',
+        max_length=TEASER_LENGTH,
+        blank=True,
+        editable=False)
     slug = models.SlugField('Название в виде url', max_length=200)
     image = models.ImageField('Картинка')
+    image_derivatives = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False)
     published_at = models.DateTimeField('Дата и время публикации', db_index=True)
+    updated_at = models.DateTimeField('Когда изменён', auto_now=True, db_index=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -72,23 +170,51 @@ class Post(models.Model):
         'Tag',
         related_name='posts',
         verbose_name='Теги')
+    likes_count = models.PositiveIntegerField(
+        'Количество лайков',
+        default=0,
+        editable=False,
+        db_index=True)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+        db_index=True)
 
     objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-published_at']
+        indexes = [
+            models.Index(fields=['published_at', 'id'], name='post_published_at_id_idx'),
+        ]
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.fill_teaser()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'teaser'}
+        super().save(*args, **kwargs)
+
+    def fill_teaser(self):
+        self.teaser = self.text[:TEASER_LENGTH]
+
     def get_absolute_url(self):
-        return reverse('post_detail', args={'slug': self.slug})
+        return reverse('post_detail', kwargs={'slug': self.slug})
 
 
 class Tag(models.Model):
     title = models.CharField('Тег', max_length=20, unique=True)
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+        db_index=True)
 
     objects = TagQuerySet.as_manager()
 
@@ -101,7 +227,7 @@ class Tag(models.Model):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('tag_filter', args={'tag_title': self.slug})
+        return reverse('tag_filter', kwargs={'tag_title': self.title})
 
     def clean(self):
         self.title = self.title.lower()
@@ -120,9 +246,14 @@ class Comment(models.Model):
 
     text = models.TextField('Текст комментария')
     published_at = models.DateTimeField('Дата и время публикации')
+    updated_at = models.DateTimeField('Когда изменён', auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['published_at']
+        indexes = [
+            models.Index(fields=['post', 'updated_at'], name='comment_post_updated_at_idx'),
+            models.Index(fields=['post', 'published_at'], name='comment_post_published_at_idx'),
+        ]
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
 
@@ -130,5 +261,70 @@ class Comment(models.Model):
         return f'{self.author.username} under {self.post.title}'
 
 
+class PageViewCount(models.Model):
+    path = models.CharField('Адрес страницы', max_length=200)
+    minute = models.DateTimeField('Минута')
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name='Пост',
+        related_name='page_views')
+    views = models.PositiveIntegerField('Просмотры', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['path', 'minute'], name='page_view_path_minute_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['minute'], name='page_view_minute_idx'),
+        ]
+        verbose_name = 'просмотры страницы'
+        verbose_name_plural = 'просмотры страниц'
+
+    def __str__(self):
+        return f'{self.path} {self.minute:%Y-%m-%d %H:%M}: {self.views}'
+
 
+class ArchiveMonth(models.Model):
+    year = models.PositiveSmallIntegerField('Год')
+    month = models.PositiveSmallIntegerField('Месяц')
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
 
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='archive_month_year_month_uniq'),
+        ]
+        verbose_name = 'месяц архива'
+        verbose_name_plural = 'месяцы архива'
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02}: {self.posts_count}'
+
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='related_posts')
+    related = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий пост',
+        related_name='related_to')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            # Заодно индекс, по которому страница поста читает свой список
+            models.UniqueConstraint(fields=['post', 'rank'], name='related_post_post_rank_uniq'),
+        ]
+        verbose_name = 'похожий пост'
+        verbose_name_plural = 'похожие посты'
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} (#{self.rank})'
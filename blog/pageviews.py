@@ -0,0 +1,152 @@
+"""
+Счётчики просмотров страниц.
+
+Строка в базе на каждый заход забила бы SQLite записью, поэтому
+PageViewMiddleware только прибавляет единицу к счётчику (адрес, минута) в
+памяти процесса. Фоновый поток раз в PAGE_VIEWS_FLUSH_INTERVAL секунд
+записывает накопленное в PageViewCount одним INSERT ... ON CONFLICT DO UPDATE
+на всю пачку, а при остановке процесса — последний раз. Если воркер убит
+без остановки, теряется не больше одного интервала.
+
+Старые поминутные строки команда compact_page_views сворачивает в дневные.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate, TruncDay
+from django.utils import timezone
+
+from blog.buffers import PeriodicFlusher
+from blog.models import PageViewCount, Post
+
+_lock = threading.Lock()
+# (адрес, минута) -> просмотры
+_counts = Counter()
+# Адрес страницы поста -> slug поста, id ищется при записи одним запросом на пачку
+_post_slugs = {}
+
+
+def record(path, post_slug=None):
+    minute = timezone.now().replace(second=0, microsecond=0)
+    with _lock:
+        _counts[(path, minute)] += 1
+        if post_slug is not None:
+            _post_slugs[path] = post_slug
+    flusher.start()
+
+
+def get_buffer_size():
+    with _lock:
+        return sum(_counts.values())
+
+
+def _get_upsert_sql():
+    table = PageViewCount._meta.db_table
+    return (
+        f'INSERT INTO {table} (path, minute, post_id, views) VALUES (%s, %s, %s, %s) '
+        'ON CONFLICT (path, minute) DO UPDATE SET '
+        'views = views + excluded.views, post_id = COALESCE(excluded.post_id, post_id)'
+    )
+
+
+def flush():
+    """Записывает буфер в базу. Возвращает количество записанных просмотров."""
+    global _counts, _post_slugs
+    with _lock:
+        counts, post_slugs = _counts, _post_slugs
+        _counts, _post_slugs = Counter(), {}
+    if not counts:
+        return 0
+
+    try:
+        post_ids = dict(Post.objects.filter(slug__in=set(post_slugs.values())).values_list('slug', 'id'))
+        rows = [
+            (
+                path,
+                connection.ops.adapt_datetimefield_value(minute),
+                post_ids.get(post_slugs.get(path)),
+                views,
+            )
+            for (path, minute), views in counts.items()
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(_get_upsert_sql(), rows)
+    except Exception:
+        # Просмотры вернутся в буфер и запишутся со следующей пачкой
+        with _lock:
+            _counts.update(counts)
+            for path, post_slug in post_slugs.items():
+                _post_slugs.setdefault(path, post_slug)
+        raise
+    return sum(counts.values())
+
+
+def compact(before):
+    """Сворачивает поминутные счётчики старше before в дневные. Возвращает, сколько строк удалено."""
+    with transaction.atomic():
+        old_counts = PageViewCount.objects.filter(minute__lt=before)
+        daily = list(
+            old_counts
+            .annotate(day=TruncDay('minute'))
+            .order_by()
+            .values('path', 'day')
+            .annotate(total=Sum('views'), post_id=Max('post'))
+        )
+        # Начало дня раньше любой его минуты, поэтому дневная строка не столкнётся со свежими
+        deleted, _ = old_counts.delete()
+        PageViewCount.objects.bulk_create([
+            PageViewCount(path=row['path'], minute=row['day'], post_id=row['post_id'], views=row['total'])
+            for row in daily
+        ])
+    return deleted - len(daily)
+
+
+def get_report(since, limit=20):
+    page_views = PageViewCount.objects.filter(minute__gte=since).order_by()
+    return {
+        'since': since,
+        'total': page_views.aggregate(total=Sum('views'))['total'] or 0,
+        'by_day': list(
+            page_views
+            .annotate(day=TruncDate('minute'))
+            .values('day')
+            .annotate(views=Sum('views'))
+            .order_by('day')
+        ),
+        'top_pages': list(
+            page_views
+            .values('path')
+            .annotate(views=Sum('views'))
+            .order_by('-views', 'path')[:limit]
+        ),
+        'most_viewed_posts': [
+            {'slug': post.slug, 'title': post.title, 'views': post.views_amount}
+            for post in Post.objects.most_viewed(since).only('slug', 'title')[:limit]
+        ],
+        'not_flushed': get_buffer_size(),
+    }
+
+
+class PageViewMiddleware:
+    """Считает успешные GET-запросы к вьюхам из PAGE_VIEWS_TRACKED_VIEWS, включая ответы 304."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        if (
+            request.method == 'GET'
+            and response.status_code in (200, 304)
+            and match is not None
+            and match.view_name in settings.PAGE_VIEWS_TRACKED_VIEWS
+        ):
+            record(request.path, match.kwargs.get('slug') if match.view_name == 'post_detail' else None)
+        return response
+
+
+flusher = PeriodicFlusher('page-views-flusher', flush, settings.PAGE_VIEWS_FLUSH_INTERVAL)
@@ -0,0 +1,130 @@
+"""
+Keyset-пагинация: страница начинается сразу после ключа последней строки
+предыдущей страницы, поэтому ни OFFSET, ни COUNT(*) не нужны и глубина
+страницы не влияет на скорость.
+
+Курсор — непрозрачная строка с ключом строки и направлением листания.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+FORWARD = 'next'
+BACKWARD = 'prev'
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+    prev_cursor: str = None
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'k': values, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['k'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise Http404('Некорректный курсор')
+    if direction not in (FORWARD, BACKWARD) or not isinstance(values, list):
+        raise Http404('Некорректный курсор')
+    return values, direction
+
+
+def _parse_ordering(ordering):
+    descending = ordering[0].startswith('-')
+    return [field.lstrip('-') for field in ordering], descending
+
+
+def _after(fields, values, descending):
+    """
+    Условие «строка идёт после ключа» в порядке fields.
+
+    Первое поле ограничено диапазоном отдельно, чтобы SQLite начал обход
+    индекса прямо с ключа, а не фильтровал строки с самого начала.
+    """
+    lookup = 'lt' if descending else 'gt'
+    range_lookup = 'lte' if descending else 'gte'
+
+    condition = Q()
+    for position, field in enumerate(fields):
+        equal_prefix = {prefix: value for prefix, value in zip(fields[:position], values)}
+        condition |= Q(**equal_prefix, **{f'{field}__{lookup}': values[position]})
+    return Q(**{f'{fields[0]}__{range_lookup}': values[0]}) & condition
+
+
+def _row_key(row, fields):
+    key = []
+    for field in fields:
+        value = getattr(row, field)
+        key.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return key
+
+
+def get_page_cursor(queryset, page, per_page, ordering=('-published_at', '-id')):
+    """
+    Курсор страницы с номером page, как если бы до неё долистали с первой.
+    Для старых адресов с номером страницы, поэтому без оглядки на OFFSET.
+    """
+    if page <= 1:
+        return None
+    fields, _ = _parse_ordering(ordering)
+    position = (page - 1) * per_page - 1
+    rows = list(queryset.order_by(*ordering).only(*fields)[position:position + 1])
+    if not rows:
+        raise Http404('Нет такой страницы')
+    return encode_cursor(_row_key(rows[0], fields), FORWARD)
+
+
+def paginate_keyset(queryset, cursor, per_page, ordering=('-published_at', '-id')):
+    """Одна страница queryset, упорядоченного по ordering — полям одного направления."""
+    fields, descending = _parse_ordering(ordering)
+    reverse_ordering = [field if descending else f'-{field}' for field in fields]
+
+    direction = FORWARD
+    if cursor:
+        raw_values, direction = decode_cursor(cursor)
+        if len(raw_values) != len(fields):
+            raise Http404('Некорректный курсор')
+        try:
+            values = [
+                queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(fields, raw_values)
+            ]
+        except ValidationError:
+            raise Http404('Некорректный курсор')
+
+        if direction == FORWARD:
+            queryset = queryset.filter(_after(fields, values, descending)).order_by(*ordering)
+        else:
+            queryset = queryset.filter(_after(fields, values, not descending)).order_by(*reverse_ordering)
+    else:
+        queryset = queryset.order_by(*ordering)
+
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == BACKWARD:
+        rows.reverse()
+        has_next, has_prev = bool(rows), has_more
+    else:
+        has_next, has_prev = has_more, bool(cursor)
+
+    page = KeysetPage(items=rows)
+    if rows and has_next:
+        page.next_cursor = encode_cursor(_row_key(rows[-1], fields), FORWARD)
+    if rows and has_prev:
+        page.prev_cursor = encode_cursor(_row_key(rows[0], fields), BACKWARD)
+    return page
@@ -0,0 +1,267 @@
+"""
+Лёгкое профилирование запросов, которое можно держать включённым в продакшене.
+
+ProfilingMiddleware меряет общее время запроса, время и число SQL-запросов и
+время рендеринга шаблонов. Результат уходит в заголовок Server-Timing, в лог
+blog.profiling строкой key=value и в скользящие гистограммы по вьюхам,
+которые отдаёт staff-only эндпоинт статистики.
+
+Медленные SQL-запросы ловятся всегда, а повторяющиеся (N+1) — только в доле
+запросов PROFILING_SQL_SAMPLE_RATE: для этого каждый SQL нормализуется в
+отпечаток, а это уже заметная работа. Найденные запросы копятся в тех же
+окнах, что и гистограммы, и исправленный запрос пропадает из статистики.
+"""
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограмм в миллисекундах, последняя — всё остальное
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+METRICS = ('total', 'db', 'template')
+# На один кусок окна, всего в окне их 10
+MAX_SQL_OFFENDERS = 200
+
+_current_profile = ContextVar('request_profile', default=None)
+_lock = threading.Lock()
+# кусок окна -> вьюха -> метрика -> гистограмма
+_windows = {}
+# кусок окна -> (вид, вьюха, отпечаток) -> сколько раз встретился и худшее значение
+_sql_offenders = {}
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+SPACES_RE = re.compile(r'\s+')
+
+
+def fingerprint_sql(sql):
+    """Заменяет литералы и списки IN на ?, чтобы запросы, отличающиеся только параметрами, совпали."""
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+@dataclass
+class RequestProfile:
+    capture_sql: bool
+    db_ms: float = 0
+    queries: int = 0
+    template_ms: float = 0
+    fingerprints: Counter = field(default_factory=Counter)
+    slow_queries: list = field(default_factory=list)
+
+
+@dataclass
+class Histogram:
+    buckets: list = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS_MS) + 1))
+    count: int = 0
+    sum_ms: float = 0
+
+    def add(self, value_ms):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+
+    def merge(self, other):
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попал перцентиль. None — больше последней границы."""
+        threshold = self.count * percent / 100
+        seen = 0
+        for bound, amount in zip(BUCKET_BOUNDS_MS + (None,), self.buckets):
+            seen += amount
+            if seen >= threshold:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum_ms / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        profile.db_ms += duration_ms
+        profile.queries += 1
+        if duration_ms >= settings.PROFILING_SLOW_QUERY_MS:
+            profile.slow_queries.append((fingerprint_sql(sql), duration_ms))
+        if profile.capture_sql:
+            profile.fingerprints[fingerprint_sql(sql)] += 1
+
+
+def _window_slot(now):
+    # Окно статистики разбито на 10 кусков, устаревшие куски выбрасываются целиком
+    return int(now // (settings.PROFILING_WINDOW_SECONDS / 10))
+
+
+def _drop_old_slots(windows, slot):
+    for old_slot in [old_slot for old_slot in windows if old_slot <= slot - 10]:
+        del windows[old_slot]
+
+
+def record_histograms(view_name, timings_ms):
+    slot = _window_slot(time.time())
+    with _lock:
+        _drop_old_slots(_windows, slot)
+        view_histograms = _windows.setdefault(slot, {}).setdefault(
+            view_name, {metric: Histogram() for metric in METRICS}
+        )
+        for metric, value_ms in timings_ms.items():
+            view_histograms[metric].add(value_ms)
+
+
+def record_sql_offender(kind, view_name, fingerprint, value):
+    key = (kind, view_name, fingerprint)
+    slot = _window_slot(time.time())
+    with _lock:
+        _drop_old_slots(_sql_offenders, slot)
+        offenders = _sql_offenders.setdefault(slot, {})
+        offender = offenders.get(key)
+        if offender is None:
+            if len(offenders) >= MAX_SQL_OFFENDERS:
+                return
+            offender = offenders[key] = {'seen': 0, 'max': 0}
+        offender['seen'] += 1
+        offender['max'] = max(offender['max'], round(value, 3))
+
+
+def get_stats():
+    slot = _window_slot(time.time())
+    merged = {}
+    with _lock:
+        for window_slot, views in _windows.items():
+            if window_slot <= slot - 10:
+                continue
+            for view_name, histograms in views.items():
+                merged_view = merged.setdefault(view_name, {metric: Histogram() for metric in METRICS})
+                for metric, histogram in histograms.items():
+                    merged_view[metric].merge(histogram)
+        merged_offenders = {}
+        for window_slot, offenders in _sql_offenders.items():
+            if window_slot <= slot - 10:
+                continue
+            for key, offender in offenders.items():
+                merged_offender = merged_offenders.setdefault(key, {'seen': 0, 'max': 0})
+                merged_offender['seen'] += offender['seen']
+                merged_offender['max'] = max(merged_offender['max'], offender['max'])
+        offenders = [
+            {'kind': kind, 'view': view_name, 'sql': fingerprint, **offender}
+            for (kind, view_name, fingerprint), offender in merged_offenders.items()
+        ]
+
+    return {
+        'window_seconds': settings.PROFILING_WINDOW_SECONDS,
+        'bucket_bounds_ms': BUCKET_BOUNDS_MS,
+        'views': {
+            view_name: {metric: histogram.to_dict() for metric, histogram in histograms.items()}
+            for view_name, histograms in sorted(merged.items())
+        },
+        'sql': sorted(offenders, key=lambda offender: -offender['seen']),
+    }
+
+
+class ProfiledTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return self.template.render(context, request)
+
+        started_at = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_ms += (time.perf_counter() - started_at) * 1000
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который засчитывает время рендеринга в профиль запроса."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        profile = RequestProfile(capture_sql=random.random() < settings.PROFILING_SQL_SAMPLE_RATE)
+        token = _current_profile.set(profile)
+        started_at = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        total_ms = (time.perf_counter() - started_at) * 1000
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_ms:.1f};desc="{profile.queries} queries"',
+            f'tpl;dur={profile.template_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        logger.info(
+            'request view=%s method=%s status=%s total_ms=%.1f db_ms=%.1f queries=%d template_ms=%.1f',
+            view_name, request.method, response.status_code,
+            total_ms, profile.db_ms, profile.queries, profile.template_ms,
+        )
+        record_histograms(view_name, {'total': total_ms, 'db': profile.db_ms, 'template': profile.template_ms})
+        self.report_sql(view_name, profile)
+        return response
+
+    def report_sql(self, view_name, profile):
+        for fingerprint, duration_ms in profile.slow_queries:
+            logger.warning('slow_query view=%s duration_ms=%.1f sql="%s"', view_name, duration_ms, fingerprint)
+            record_sql_offender('slow', view_name, fingerprint, duration_ms)
+
+        for fingerprint, repeats in profile.fingerprints.items():
+            if repeats < settings.PROFILING_DUPLICATE_QUERY_THRESHOLD:
+                continue
+            logger.warning('duplicate_query view=%s repeats=%d sql="%s"', view_name, repeats, fingerprint)
+            record_sql_offender('duplicate', view_name, fingerprint, repeats)
@@ -0,0 +1,256 @@
+"""
+Похожие посты по общим тегам.
+
+Пост — разреженный вектор из нулей и единиц по тегам, который хранится как
+frozenset id тегов. Похожесть двух постов — косинус между векторами:
+общие теги / sqrt(теги первого * теги второго). При равной похожести выше
+стоит более популярный пост: больше likes_count, затем больший id.
+
+Попарно сравнивать 100 000 постов нельзя, а у популярного тега десятки тысяч
+постов, поэтому кандидаты берутся из корзин. Корзина (U, n) — посты, у
+которых есть все теги подмножества U и всего n тегов, и в ней хранятся только
+limit + 1 самых популярных. Это точно: пост, не попавший в корзину своего
+пересечения с текущим, вытеснили limit + 1 постов, которые не менее похожи и
+более популярны. Подмножества берутся до MAX_SUBSET_SIZE тегов, у постов
+с бóльшим пересечением порядок становится приблизительным. Посты с одинаковым
+набором тегов получают один и тот же список, он считается один раз.
+
+Готовые списки лежат в RelatedPost, страница поста читает свой одним
+запросом по индексу (post, rank). Когда у поста меняются теги, после коммита
+его id ложится в буфер, и фоновый поток раз в RELATED_POSTS_UPDATE_INTERVAL
+секунд пересчитывает списки этих постов и списки, в которых они стоят, —
+update_posts(). Похожими могут быть только посты с общим тегом, поэтому
+корзины строятся только из них, а ранжируются только эти посты. В чужие
+списки новый пост попадает после полной пересборки командой
+compute_related_posts, так же как и изменения likes_count.
+"""
+import threading
+from collections import defaultdict
+from itertools import combinations, islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from blog import sidebar
+from blog.buffers import PeriodicFlusher
+from blog.images import serialize_image
+from blog.models import Post, RelatedPost
+
+MAX_SUBSET_SIZE = 4
+LOAD_CHUNK_SIZE = 10000
+STORE_BATCH_SIZE = 5000
+# Больше — пересборка целиком: она ненамного дороже и не упирается в размер IN (...)
+MAX_UPDATE_POSTS = 1000
+
+_lock = threading.Lock()
+# id постов, чьи списки ждут пересчёта
+_pending_ids = set()
+
+
+def iter_subsets(tags):
+    tags = sorted(tags)
+    for size in range(1, min(len(tags), MAX_SUBSET_SIZE) + 1):
+        yield from combinations(tags, size)
+
+
+def load_tag_vectors(post_ids=None):
+    """
+    Теги каждого поста и id постов от самого популярного. С post_ids — только
+    посты, у которых есть общий тег с одним из post_ids: корзины их подмножеств
+    тегов из них и состоят.
+    """
+    PostTag = Post.tags.through
+    post_tags = PostTag.objects.all()
+    if post_ids is not None:
+        tag_ids = PostTag.objects.filter(post_id__in=post_ids).values('tag_id')
+        post_tags = post_tags.filter(post_id__in=PostTag.objects.filter(tag_id__in=tag_ids).values('post_id'))
+
+    tags_by_post = defaultdict(list)
+    for post_id, tag_id in post_tags.values_list('post_id', 'tag_id').iterator(chunk_size=LOAD_CHUNK_SIZE):
+        tags_by_post[post_id].append(tag_id)
+    # Порядок всех постов читается по индексу likes_count, а для части пришлось бы сортировать
+    popular_ids = Post.objects.popular().values_list('id', flat=True).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    if post_ids is None:
+        popular_ids = list(popular_ids)
+    else:
+        popular_ids = [post_id for post_id in popular_ids if post_id in tags_by_post]
+    vectors = {post_id: frozenset(tags) for post_id, tags in tags_by_post.items()}
+    return vectors, popular_ids
+
+
+def build_buckets(vectors, popular_ids, limit):
+    buckets = defaultdict(list)
+    for post_id in popular_ids:
+        tags = vectors.get(post_id)
+        if not tags:
+            continue
+        for subset in iter_subsets(tags):
+            bucket = buckets[(subset, len(tags))]
+            if len(bucket) <= limit:
+                bucket.append(post_id)
+    return buckets
+
+
+def rank_candidates(tags, vectors, buckets, popularity, tags_amounts, limit):
+    """
+    limit + 1 самых похожих на набор тегов tags постов.
+
+    Корзины обходятся по убыванию похожести. Вместо косинуса |U| / sqrt(|tags| * n)
+    сравнивается |U|² / n: порядок тот же, а деление без корня даёт равные
+    числа для равных дробей, и такие корзины попадают в один ярус, где
+    порядок решает популярность.
+    """
+    keys_by_similarity = defaultdict(list)
+    for subset in iter_subsets(tags):
+        for tags_amount in tags_amounts:
+            if (subset, tags_amount) in buckets:
+                keys_by_similarity[len(subset) ** 2 / tags_amount].append((subset, tags_amount))
+
+    ranked = []
+    for similarity in sorted(keys_by_similarity, reverse=True):
+        tier = set()
+        for subset, tags_amount in keys_by_similarity[similarity]:
+            for candidate in buckets[(subset, tags_amount)]:
+                shared = len(tags & vectors[candidate])
+                # Пост с бóльшим пересечением учтён в корзине этого пересечения
+                if shared == len(subset) or len(subset) == MAX_SUBSET_SIZE:
+                    tier.add(candidate)
+        ranked.extend(sorted(tier, key=popularity.__getitem__))
+        if len(ranked) > limit:
+            break
+    return ranked[:limit + 1]
+
+
+def compute(vectors, popular_ids, limit, post_ids=None):
+    """Похожие посты для post_ids или всех постов: {id поста: [id похожих по убыванию]}."""
+    popularity = {post_id: place for place, post_id in enumerate(popular_ids)}
+    buckets = build_buckets(vectors, popular_ids, limit)
+    tags_amounts = sorted({len(tags) for tags in vectors.values()})
+    ranked_by_tags = {}
+    related = {}
+    for post_id in vectors if post_ids is None else post_ids:
+        tags = vectors.get(post_id)
+        if not tags:
+            related[post_id] = []
+            continue
+        # Посты с одинаковыми тегами получают один список
+        ranked = ranked_by_tags.get(tags)
+        if ranked is None:
+            ranked = rank_candidates(tags, vectors, buckets, popularity, tags_amounts, limit)
+            ranked_by_tags[tags] = ranked
+        related[post_id] = [candidate for candidate in ranked if candidate != post_id][:limit]
+    return related
+
+
+def iter_rows(related):
+    for post_id, related_ids in related.items():
+        for rank, related_id in enumerate(related_ids):
+            yield post_id, related_id, rank
+
+
+def store(related, replace_all=False):
+    # Полмиллиона строк через bulk_create — это полмиллиона моделей, executemany в разы быстрее
+    table = RelatedPost._meta.db_table
+    sql = f'INSERT INTO {table} (post_id, related_id, rank) VALUES (%s, %s, %s)'
+    with transaction.atomic(), connection.cursor() as cursor:
+        if replace_all:
+            RelatedPost.objects.all().delete()
+        else:
+            RelatedPost.objects.filter(post_id__in=list(related)).delete()
+        rows = iter_rows(related)
+        while True:
+            batch = list(islice(rows, STORE_BATCH_SIZE))
+            if not batch:
+                break
+            cursor.executemany(sql, batch)
+    sidebar.invalidate()
+
+
+def rebuild(limit=None):
+    """Пересобирает RelatedPost целиком. Возвращает количество постов со списком."""
+    vectors, popular_ids = load_tag_vectors()
+    related = compute(vectors, popular_ids, limit or settings.RELATED_POSTS_AMOUNT)
+    store(related, replace_all=True)
+    return len(related)
+
+
+def get_referrer_ids(post_ids):
+    """Посты, в списках которых стоят посты post_ids."""
+    return set(RelatedPost.objects.filter(related_id__in=post_ids).values_list('post_id', flat=True))
+
+
+def update_posts(post_ids, limit=None):
+    """
+    Пересчитывает списки постов post_ids и постов, в списках которых они стоят.
+
+    Когда постов много, общие теги есть почти у всех, и таблица
+    пересобирается целиком.
+    """
+    limit = limit or settings.RELATED_POSTS_AMOUNT
+    post_ids = set(post_ids)
+    if len(post_ids) <= MAX_UPDATE_POSTS:
+        post_ids |= get_referrer_ids(post_ids)
+    if len(post_ids) > MAX_UPDATE_POSTS:
+        return rebuild(limit)
+
+    # Пост без тегов в векторы не попадёт, но его старый список надо стереть
+    existing_ids = list(Post.objects.filter(id__in=post_ids).values_list('id', flat=True))
+    vectors, popular_ids = load_tag_vectors(existing_ids)
+    related = compute(vectors, popular_ids, limit, existing_ids)
+    store(related)
+    return len(related)
+
+
+def queue_update(post_ids):
+    """Откладывает update_posts() до фонового потока: пересчёт не должен держать запрос."""
+    with _lock:
+        _pending_ids.update(post_ids)
+    flusher.start()
+
+
+def update_posts_on_commit(post_ids):
+    """
+    queue_update() после коммита. Форма поста в админке сначала удаляет теги,
+    потом добавляет, и все шаги сольются в буфере в один пересчёт.
+    """
+    post_ids = set(post_ids)
+    transaction.on_commit(lambda: queue_update(post_ids))
+
+
+def flush():
+    """Пересчитывает списки постов из буфера. Возвращает количество пересчитанных."""
+    global _pending_ids
+    with _lock:
+        post_ids, _pending_ids = _pending_ids, set()
+    if not post_ids:
+        return 0
+    try:
+        return update_posts(post_ids)
+    except Exception:
+        with _lock:
+            _pending_ids |= post_ids
+        raise
+
+
+def serialize_related_post(post):
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        'author': post.author.username,
+        'published_at': post.published_at,
+        **serialize_image(post),
+    }
+
+
+def get_related_posts(post):
+    posts = (
+        Post.objects
+        .filter(related_to__post=post)
+        .select_related('author')
+        .only('title', 'slug', 'published_at', 'image', 'image_derivatives', 'author__username')
+        .order_by('related_to__rank')
+    )
+    return [serialize_related_post(related_post) for related_post in posts]
+
+
+flusher = PeriodicFlusher('related-posts-updater', flush, settings.RELATED_POSTS_UPDATE_INTERVAL)
@@ -0,0 +1,179 @@
+"""
+Чтение с реплик базы.
+
+Вьюхи, помеченные @use_replica, читают с одной из реплик из
+settings.DATABASE_REPLICA_WEIGHTS, всё остальное и любая запись идут в default.
+Реплика выбирается один раз на запрос, чтобы вся страница была собрана из
+одного снимка данных.
+
+Чтобы пользователь сразу видел свой лайк или комментарий, после записи
+ReplicaMiddleware ставит куку и следующие REPLICA_STICKY_SECONDS секунд его
+запросы читают с default. Недоступная реплика на REPLICA_RETRY_SECONDS
+выключается, а запрос повторяется на default.
+"""
+import itertools
+import math
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE_NAME = 'replica_pin'
+
+_request_state = ContextVar('replica_request_state', default=None)
+_round_robin_counter = itertools.count()
+_down_until = {}
+
+
+@dataclass
+class RequestState:
+    pinned: bool = False
+    use_replica: bool = False
+    wrote: bool = False
+    alias: str = None
+    # Через сколько секунд отложенная запись попадёт в базу
+    write_delay: float = 0
+
+
+def mark_down(alias):
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    connections[alias].close()
+
+
+def is_available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    connection = connections[alias]
+    # SQLite молча создаст пустую базу вместо отсутствующей
+    if connection.vendor == 'sqlite' and not os.path.exists(connection.settings_dict['NAME']):
+        mark_down(alias)
+        return False
+    try:
+        connection.ensure_connection()
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    weights = {
+        alias: weight
+        for alias, weight in settings.DATABASE_REPLICA_WEIGHTS.items()
+        if weight > 0 and is_available(alias)
+    }
+    if not weights:
+        return DEFAULT_DB_ALIAS
+
+    policy = settings.DATABASE_REPLICA_POLICY
+    if policy == 'random':
+        return random.choices(list(weights), weights=list(weights.values()))[0]
+    if policy == 'round-robin':
+        pool = [alias for alias, weight in weights.items() for _ in range(weight)]
+        return pool[next(_round_robin_counter) % len(pool)]
+    raise ImproperlyConfigured(f'Неизвестная политика выбора реплики: {policy}')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or not state.use_replica or state.pinned or state.wrote:
+            return None
+        if state.alias is None:
+            state.alias = choose_replica()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными при синхронизации
+        return db not in settings.DATABASE_REPLICA_WEIGHTS
+
+
+def pin_to_default(write_delay=0):
+    """
+    Запрос сам в базу не пишет, но его запись попадёт туда в ближайшие
+    write_delay секунд — как лайк из буфера. Ставит ту же куку, что и запись.
+    """
+    state = _request_state.get()
+    if state is not None:
+        state.wrote = True
+        state.write_delay = max(state.write_delay, write_delay)
+
+
+@contextmanager
+def read_from_default():
+    """
+    Читает с default внутри вьюхи с @use_replica. Нужно тому, что кладётся в
+    общий кэш под текущей версией: с отставшей реплики туда попали бы данные
+    до изменения, которое эту версию и поменяло.
+    """
+    state = _request_state.get()
+    if state is None or not state.use_replica:
+        yield
+        return
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = True
+
+
+def use_replica(view):
+    """Разрешает вьюхе читать с реплики. Вьюха не должна ничего писать."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _request_state.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+
+        state.use_replica = True
+        try:
+            return view(request, *args, **kwargs)
+        except DatabaseError:
+            if state.alias in (None, DEFAULT_DB_ALIAS):
+                raise
+            mark_down(state.alias)
+            state.alias = DEFAULT_DB_ALIAS
+            return view(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+    return wrapper
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(pinned=PIN_COOKIE_NAME in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS + math.ceil(state.write_delay),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
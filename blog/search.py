@@ -0,0 +1,202 @@
+"""
+Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс — виртуальная таблица blog_post_fts, у которой rowid совпадает с id
+поста. Сигналы обновляют её при сохранении и удалении постов, а команда
+rebuild_search_index пересобирает целиком. Если база не SQLite или FTS5 не
+собран, поиск откатывается на icontains.
+"""
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from blog.models import Post
+from blog.pagination import FORWARD, KeysetPage, decode_cursor, encode_cursor, paginate_keyset
+
+FTS_TABLE = 'blog_post_fts'
+# Веса колонок для bm25: совпадение в заголовке важнее совпадения в тексте
+BM25_WEIGHTS = (10.0, 1.0, 0.5)
+SNIPPET_TOKENS = 24
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+
+@receiver(connection_created)
+def forget_availability(sender, connection, **kwargs):
+    # Новое соединение может смотреть в другую базу, например во временную
+    connection._fts_available = False
+
+
+def is_available():
+    if connection.vendor != 'sqlite':
+        return False
+    # Запоминаем только наличие индекса: воркер, запущенный до миграции
+    # 0021, должен начать им пользоваться сразу после неё
+    if getattr(connection, '_fts_available', False):
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE],
+        )
+        connection._fts_available = cursor.fetchone() is not None
+    return connection._fts_available
+
+
+def _comments_column():
+    if settings.SEARCH_INDEX_COMMENTS:
+        return "(SELECT group_concat(text, ' ') FROM blog_comment WHERE post_id = blog_post.id)"
+    return "''"
+
+
+def _chunks(post_ids, size=500):
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), size):
+        chunk = post_ids[start:start + size]
+        yield chunk, ', '.join(['%s'] * len(chunk))
+
+
+def index_posts(post_ids):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for chunk, placeholders in _chunks(post_ids):
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, text, comments) '
+                f'SELECT id, title, text, {_comments_column()} FROM blog_post WHERE id IN ({placeholders})',
+                chunk,
+            )
+
+
+def remove_posts(post_ids):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for chunk, placeholders in _chunks(post_ids):
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def rebuild(batch_size=5000):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        last_id = 0
+        while True:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, text, comments) '
+                f'SELECT id, title, text, {_comments_column()} FROM blog_post '
+                'WHERE id > %s ORDER BY id LIMIT %s',
+                [last_id, batch_size],
+            )
+            cursor.execute(f'SELECT max(rowid) FROM {FTS_TABLE}')
+            max_id = cursor.fetchone()[0]
+            if max_id is None or max_id == last_id:
+                break
+            last_id = max_id
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+def build_match_query(query):
+    """Слова запроса в кавычках через AND, последнее — префиксом: «бизн» найдёт «бизнес»."""
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def search_ids(match_query, after=None, limit=20):
+    """Id постов и их ранг bm25 по возрастанию (лучшие первыми), начиная после ключа after."""
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    sql = (
+        f'SELECT rowid, score FROM ('
+        f'SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        f')'
+    )
+    params = [match_query]
+    if after is not None:
+        score, post_id = after
+        sql += ' WHERE score > %s OR (score = %s AND rowid > %s)'
+        params += [score, score, post_id]
+    sql += ' ORDER BY score, rowid LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(sql, params)
+        except DatabaseError:
+            return []
+        return cursor.fetchall()
+
+
+def get_snippets(match_query, post_ids):
+    if not post_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, %s, {SNIPPET_TOKENS}) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})',
+            [HIGHLIGHT_START, HIGHLIGHT_END, '…', match_query, *post_ids],
+        )
+        return {post_id: highlight(snippet) for post_id, snippet in cursor.fetchall()}
+
+
+def naive_search(query, queryset=None):
+    """Поиск без индекса: полный перебор таблицы через LIKE."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    return queryset.filter(title__icontains=query) | queryset.filter(text__icontains=query)
+
+
+def search_page(queryset, query, cursor, per_page):
+    """Страница результатов поиска: лучшие по bm25 первыми, листание вперёд по курсору."""
+    match_query = build_match_query(query)
+    if match_query is None:
+        return KeysetPage(items=[])
+    if not is_available():
+        return paginate_keyset(naive_search(query, queryset), cursor, per_page)
+
+    after = None
+    if cursor:
+        values, direction = decode_cursor(cursor)
+        if direction != FORWARD or len(values) != 2:
+            raise Http404('Некорректный курсор')
+        after = values
+
+    rows = search_ids(match_query, after, limit=per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    post_ids = [post_id for post_id, _ in rows]
+
+    # Порядок задаёт ранжирование, сортировка по дате публикации не нужна
+    posts_by_id = queryset.order_by().in_bulk(post_ids)
+    snippets = get_snippets(match_query, post_ids)
+    items = []
+    for post_id in post_ids:
+        if post_id in posts_by_id:
+            post = posts_by_id[post_id]
+            post.snippet = snippets.get(post_id)
+            items.append(post)
+
+    page = KeysetPage(items=items)
+    if has_more:
+        last_id, last_score = rows[-1]
+        page.next_cursor = encode_cursor([last_score, last_id], FORWARD)
+    return page
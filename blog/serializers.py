@@ -0,0 +1,38 @@
+from blog.images import serialize_image
+
+
+def serialize_tag(tag):
+    return {
+        'title': tag.title,
+        'posts_with_tag': tag.posts_count,
+    }
+
+
+def serialize_post(post):
+    # Теги ждём из prefetch, иначе будет лишний запрос на каждый пост
+    tags = getattr(post, 'annotated_tags', None)
+    if tags is None:
+        tags = list(post.tags.all())
+
+    return {
+        'id': post.id,
+        # Версия для кэша карточек: меняется при правке поста, его тегов, лайках и комментариях
+        'updated_at': post.updated_at,
+        'title': post.title,
+        'teaser_text': post.teaser,
+        'author': post.author.username,
+        'comments_amount': post.comments_amount,
+        'published_at': post.published_at,
+        'slug': post.slug,
+        'tags': [serialize_tag(tag) for tag in tags],
+        'first_tag_title': tags[0].title if tags else None,
+        **serialize_image(post),
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'text': comment.text,
+        'published_at': comment.published_at,
+        'author': comment.author.username,
+    }
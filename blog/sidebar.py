@@ -0,0 +1,92 @@
+"""
+Кэш сайдбара: популярные теги и самые популярные посты.
+
+Данные лежат под ключом с версией. Любое изменение постов, тегов, лайков или
+комментариев после коммита меняет версию, и следующий запрос пересобирает
+сайдбар. Пока один процесс пересобирает, остальные отдают предыдущую версию.
+Пересобирается сайдбар всегда по default: реплика может ещё не видеть
+изменения, поменявшего версию.
+"""
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from blog import archive
+from blog.models import Post, Tag
+from blog.replicas import read_from_default
+from blog.serializers import serialize_post, serialize_tag
+
+SIDEBAR_VERSION_KEY = 'blog:sidebar:version'
+SIDEBAR_DATA_KEY = 'blog:sidebar:data:{version}'
+SIDEBAR_LATEST_KEY = 'blog:sidebar:latest'
+SIDEBAR_LOCK_KEY = 'blog:sidebar:lock'
+
+# Через сколько секунд данные считаются несвежими даже без инвалидации
+SIDEBAR_FRESH_TIMEOUT = 10 * 60
+# Сколько хранить данные в кэше, чтобы было что отдать во время пересборки
+SIDEBAR_STALE_TIMEOUT = 24 * 60 * 60
+SIDEBAR_LOCK_TIMEOUT = 30
+
+
+def build_sidebar():
+    most_popular_posts = (
+        Post.objects
+        .defer('text')
+        .with_counts()
+        .select_related('author')
+        .prefetch_related(Tag.objects.prefetch_with_post_count())
+        .top_popular(5)
+    )
+    return {
+        'popular_tags': [serialize_tag(tag) for tag in Tag.objects.popular()],
+        'most_popular_posts': [serialize_post(post) for post in most_popular_posts],
+        **archive.get_archive_sidebar(),
+    }
+
+
+def get_version():
+    version = cache.get(SIDEBAR_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(SIDEBAR_VERSION_KEY, version, None)
+        version = cache.get(SIDEBAR_VERSION_KEY, version)
+    return version
+
+
+def get_changed_at():
+    """Когда сайдбар последний раз инвалидировали: версия — это время в наносекундах."""
+    return datetime.datetime.fromtimestamp(get_version() / 10 ** 9, tz=datetime.timezone.utc)
+
+
+def invalidate():
+    # До коммита другой процесс собрал бы сайдбар из старых данных уже под новой версией
+    transaction.on_commit(lambda: cache.set(SIDEBAR_VERSION_KEY, time.time_ns(), None))
+
+
+def get_sidebar():
+    version = get_version()
+    data_key = SIDEBAR_DATA_KEY.format(version=version)
+
+    entry = cache.get(data_key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['sidebar']
+
+    stale_entry = entry or cache.get(SIDEBAR_LATEST_KEY)
+    is_locked = cache.add(SIDEBAR_LOCK_KEY, version, SIDEBAR_LOCK_TIMEOUT)
+    if not is_locked and stale_entry is not None:
+        return stale_entry['sidebar']
+
+    try:
+        with read_from_default():
+            sidebar = build_sidebar()
+        entry = {
+            'sidebar': sidebar,
+            'fresh_until': time.time() + SIDEBAR_FRESH_TIMEOUT,
+        }
+        cache.set_many({data_key: entry, SIDEBAR_LATEST_KEY: entry}, SIDEBAR_STALE_TIMEOUT)
+    finally:
+        if is_locked:
+            cache.delete(SIDEBAR_LOCK_KEY)
+    return entry['sidebar']
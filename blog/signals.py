@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from blog import archive, images, leaderboard, related, search, sidebar
+from blog.models import Comment, Post, Tag
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # После очистки связей уже не узнать, каких постов она коснулась
+        if reverse:
+            instance._cleared_post_ids = list(instance.liked_posts.values_list('id', flat=True))
+        return
+
+    if action == 'post_add':
+        # В pk_set приходят только действительно добавленные связи
+        if reverse:
+            post_ids = pk_set
+            Post.objects.filter(id__in=post_ids).update(
+                likes_count=F('likes_count') + 1,
+                updated_at=timezone.now(),
+            )
+        else:
+            post_ids = [instance.id]
+            Post.objects.filter(id__in=post_ids).update(
+                likes_count=F('likes_count') + len(pk_set),
+                updated_at=timezone.now(),
+            )
+    elif action in ('post_remove', 'post_clear'):
+        if reverse:
+            post_ids = pk_set if action == 'post_remove' else instance.__dict__.pop('_cleared_post_ids', [])
+        else:
+            post_ids = [instance.id]
+        Post.objects.filter(id__in=post_ids).recount_likes()
+    else:
+        return
+    leaderboard.invalidate()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_posts_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_post_ids = list(instance.posts.values_list('id', flat=True))
+        else:
+            instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        tag_ids = [instance.id]
+        post_ids = instance.__dict__.pop('_cleared_post_ids', []) if action == 'post_clear' else pk_set
+    else:
+        tag_ids = instance.__dict__.pop('_cleared_tag_ids', []) if action == 'post_clear' else pk_set
+        post_ids = [instance.id]
+    Tag.objects.filter(id__in=tag_ids).recount_posts()
+    Post.objects.filter(id__in=post_ids).touch()
+    related.update_posts_on_commit(post_ids)
+
+
+@receiver(post_save, sender=Tag)
+def touch_tagged_posts(sender, instance, created, **kwargs):
+    # Название тега выводится в карточках постов
+    if not created:
+        instance.posts.touch()
+
+
+@receiver(post_save, sender=Post)
+def invalidate_leaderboard_on_create(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.invalidate()
+
+
+@receiver(pre_save, sender=Post)
+def remember_published_at(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_published_at = (
+            Post.objects.filter(pk=instance.pk).values_list('published_at', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def update_archive_on_save(sender, instance, created, **kwargs):
+    previous_published_at = instance.__dict__.pop('_previous_published_at', None)
+    if created or previous_published_at is None:
+        archive.add_post(instance.published_at)
+        return
+
+    months = {archive.get_month(previous_published_at), archive.get_month(instance.published_at)}
+    if len(months) > 1:
+        archive.recount_months(months)
+
+
+@receiver(post_delete, sender=Post)
+def update_archive_on_delete(sender, instance, **kwargs):
+    archive.recount_months([archive.get_month(instance.published_at)])
+
+
+@receiver(post_save, sender=Post)
+def build_image_derivatives(sender, instance, **kwargs):
+    # Pillow не должен держать сохранение поста, копии делает фоновый поток
+    if images.needs_derivatives(instance):
+        post_id = instance.id
+        transaction.on_commit(lambda: images.queue_derivatives([post_id]))
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    search.index_posts([instance.id])
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_posts([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def update_search_index_for_comment(sender, instance, **kwargs):
+    if settings.SEARCH_INDEX_COMMENTS:
+        search.index_posts([instance.post_id])
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_post(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_post_id = (
+            Comment.objects.filter(pk=instance.pk).values_list('post_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Comment)
+def update_comments_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(id=instance.post_id).update(
+            comments_count=F('comments_count') + 1,
+            updated_at=timezone.now(),
+        )
+        return
+
+    previous_post_id = instance.__dict__.pop('_previous_post_id', None)
+    if previous_post_id and previous_post_id != instance.post_id:
+        Post.objects.filter(id__in=[previous_post_id, instance.post_id]).recount_comments()
+
+
+@receiver(post_delete, sender=Comment)
+def update_comments_count_on_delete(sender, instance, **kwargs):
+    Post.objects.filter(id=instance.post_id).recount_comments()
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_referrers(sender, instance, **kwargs):
+    # Строки RelatedPost удалятся каскадом, и эти списки станут короче
+    instance._related_referrer_ids = related.get_referrer_ids([instance.id])
+
+
+@receiver(post_delete, sender=Post)
+def update_related_posts_on_delete(sender, instance, **kwargs):
+    referrer_ids = instance.__dict__.pop('_related_referrer_ids', set())
+    if referrer_ids:
+        related.update_posts_on_commit(referrer_ids)
+
+
+@receiver(post_delete, sender=Post)
+def update_posts_count_on_delete(sender, instance, **kwargs):
+    Tag.objects.filter(id__in=instance.__dict__.pop('_deleted_tag_ids', [])).recount_posts()
+    leaderboard.invalidate()
+
+
+@receiver(pre_delete, sender=User)
+def remember_liked_posts(sender, instance, **kwargs):
+    instance._liked_post_ids = list(instance.liked_posts.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def update_likes_count_on_user_delete(sender, instance, **kwargs):
+    liked_post_ids = instance.__dict__.pop('_liked_post_ids', [])
+    Post.objects.filter(id__in=liked_post_ids).recount_likes()
+    leaderboard.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver(m2m_changed, sender=Post.likes.through)
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_sidebar(sender, action='post_save', **kwargs):
+    if action.startswith('post_'):
+        sidebar.invalidate()
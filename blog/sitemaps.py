@@ -0,0 +1,211 @@
+"""
+sitemap.xml с индексом и RSS/Atom-ленты сайта и тегов.
+
+Карта сайта собирается потоком из values_list(...).iterator(): в памяти
+нет ни моделей, ни полного списка адресов. Пока первый запрос отдаёт карту,
+она копится и после отдачи кладётся в кэш. Ключ кэша содержит время
+последнего изменения сайта, поэтому любое изменение постов, тегов или
+лайков даёт новый ключ, а старый просто истекает. Это же время даёт ETag и
+Last-Modified для условных GET.
+
+Файлы карты делят посты и теги по диапазонам id, а не по номерам строк: файл
+читается по первичному ключу без OFFSET, и удалённый пост не сдвигает адреса
+во всех следующих файлах.
+"""
+import re
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.urls.converters import SlugConverter
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from blog.conditional import conditional_page, get_site_last_modified
+from blog.models import Post, Tag
+
+# Больше адресов в одном файле поисковики не принимают
+SITEMAP_MAX_URLS = 50000
+SITEMAP_CHUNK_SIZE = 2000
+CACHE_TIMEOUT = 24 * 60 * 60
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+SITEMAP_KEY = 'blog:sitemap:{host}:{name}:{version}'
+FEED_KEY = 'blog:feed:{host}:{kind}:{tag}:{version}'
+FEED_SIZE = 20
+FEED_FORMATS = {'rss': Rss201rev2Feed, 'atom': Atom1Feed}
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SECTION_MODELS = {'posts': Post, 'tags': Tag}
+# Тег, название которого не пропустит конвертер slug, по адресу тега не открыть
+TAG_TITLE_RE = re.compile(SlugConverter.regex)
+
+
+def get_last_modified(request):
+    # conditional_page уже посчитал время изменения для ETag, второй раз в базу не ходим
+    if not hasattr(request, '_last_modified'):
+        request._last_modified = get_site_last_modified(request)
+    return request._last_modified
+
+
+def get_cache_key(template, request, **kwargs):
+    version = get_last_modified(request)
+    return template.format(
+        host=request.get_host(),
+        version=version.isoformat() if version else 'empty',
+        **kwargs,
+    )
+
+
+def cached_stream(cache_key, chunks, content_type):
+    """Отдаёт готовый ответ из кэша или поток chunks, который по окончании ляжет в кэш."""
+    content = cache.get(cache_key)
+    if content is not None:
+        return HttpResponse(content, content_type=content_type)
+
+    def stream_and_cache():
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        cache.set(cache_key, ''.join(parts), CACHE_TIMEOUT)
+
+    return StreamingHttpResponse(stream_and_cache(), content_type=content_type)
+
+
+def get_pages_amount(model):
+    # В файле page лежат id от (page - 1) * SITEMAP_MAX_URLS + 1, максимум id берётся из индекса
+    max_id = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    return max(1, -(-max_id // SITEMAP_MAX_URLS))
+
+
+def get_sections():
+    """Имена файлов карты сайта: posts-1, posts-2, …, tags-1."""
+    return [
+        f'{section}-{page}'
+        for section, model in SECTION_MODELS.items()
+        for page in range(1, get_pages_amount(model) + 1)
+    ]
+
+
+def get_url_builder(request, view_name, kwarg):
+    """
+    Функция, которая строит абсолютный адрес по значению slug.
+
+    reverse() на каждый из 50 000 адресов — основная работа карты сайта, поэтому
+    адрес разворачивается один раз с заглушкой. Конвертер slug не пропускает
+    символов, которые надо экранировать, так что подстановка безопасна, если
+    value прошло проверку TAG_TITLE_RE.
+    """
+    placeholder = 'sitemap-slug-placeholder'
+    prefix, suffix = request.build_absolute_uri(reverse(view_name, kwargs={kwarg: placeholder})).split(placeholder)
+    return lambda value: f'{prefix}{value}{suffix}'
+
+
+def iter_section_urls(request, section, page):
+    # Диапазон id файла не меняется от новых постов, поэтому файлы карты стабильны
+    rows = (
+        SECTION_MODELS[section].objects
+        .filter(id__gt=(page - 1) * SITEMAP_MAX_URLS, id__lte=page * SITEMAP_MAX_URLS)
+        .order_by('id')
+    )
+    if section == 'posts':
+        build_url = get_url_builder(request, 'post_detail', 'slug')
+        rows = rows.values_list('slug', 'updated_at').iterator(chunk_size=SITEMAP_CHUNK_SIZE)
+        for slug, updated_at in rows:
+            yield build_url(slug), updated_at
+    else:
+        build_url = get_url_builder(request, 'tag_filter', 'tag_title')
+        rows = rows.values_list('title', flat=True).iterator(chunk_size=SITEMAP_CHUNK_SIZE)
+        for title in rows:
+            if TAG_TITLE_RE.fullmatch(title):
+                yield build_url(title), None
+
+
+def render_urlset(request, section, page):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    parts = []
+    for url, lastmod in iter_section_urls(request, section, page):
+        lastmod = f'<lastmod>{lastmod.date().isoformat()}</lastmod>' if lastmod else ''
+        parts.append(f'<url><loc>{escape(url)}</loc>{lastmod}</url>\n')
+        if len(parts) >= SITEMAP_CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+    parts.append('</urlset>\n')
+    yield ''.join(parts)
+
+
+@conditional_page(get_site_last_modified)
+def sitemap_index(request):
+    last_modified = get_last_modified(request)
+    lastmod = f'<lastmod>{last_modified.date().isoformat()}</lastmod>' if last_modified else ''
+    sitemaps = ''.join(
+        f'<sitemap><loc>{escape(request.build_absolute_uri(reverse("sitemap_section", args=[name])))}</loc>'
+        f'{lastmod}</sitemap>\n'
+        for name in get_sections()
+    )
+    content = (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n'
+        f'{sitemaps}</sitemapindex>\n'
+    )
+    return HttpResponse(content, content_type=SITEMAP_CONTENT_TYPE)
+
+
+@conditional_page(get_site_last_modified)
+def sitemap_section(request, name):
+    if name not in get_sections():
+        raise Http404('Нет такого файла карты сайта')
+    section, _, page = name.rpartition('-')
+    cache_key = get_cache_key(SITEMAP_KEY, request, name=name)
+    return cached_stream(cache_key, render_urlset(request, section, int(page)), SITEMAP_CONTENT_TYPE)
+
+
+def build_feed(request, kind, tag_title):
+    posts = Post.objects.fresh()
+    title = 'Sensive Blog'
+    link = reverse('index')
+    if tag_title:
+        tag = get_object_or_404(Tag, title=tag_title)
+        posts = Post.objects.with_tag(tag).fresh()
+        title = f'Sensive Blog: {tag.title}'
+        link = reverse('tag_filter', kwargs={'tag_title': tag.title})
+
+    feed = FEED_FORMATS[kind](
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=f'Свежие посты {title}',
+        language='ru',
+        feed_url=request.build_absolute_uri(),
+    )
+    # Полный текст не нужен: описание — готовый анонс поста
+    rows = (
+        posts
+        .values_list('title', 'slug', 'teaser', 'published_at', 'updated_at', 'author__username')[:FEED_SIZE]
+        .iterator(chunk_size=FEED_SIZE)
+    )
+    for post_title, slug, description, published_at, updated_at, author in rows:
+        url = request.build_absolute_uri(reverse('post_detail', kwargs={'slug': slug}))
+        feed.add_item(
+            title=post_title,
+            link=url,
+            description=description,
+            unique_id=url,
+            pubdate=published_at,
+            updateddate=updated_at,
+            author_name=author,
+        )
+    return feed
+
+
+@conditional_page(get_site_last_modified)
+def feed(request, kind, tag_title=None):
+    if kind not in FEED_FORMATS:
+        raise Http404('Нет такой ленты')
+    content_type = FEED_FORMATS[kind].content_type
+    cache_key = get_cache_key(FEED_KEY, request, kind=kind, tag=tag_title or '')
+    content = cache.get(cache_key)
+    if content is None:
+        content = build_feed(request, kind, tag_title).writeString('utf-8')
+        cache.set(cache_key, content, CACHE_TIMEOUT)
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,35 @@
+"""
+Настройка соединений с SQLite.
+
+Прагмы из settings.SQLITE_PRAGMAS применяются к каждому новому соединению.
+С постоянными соединениями (CONN_MAX_AGE) это происходит раз на процесс,
+а не на каждый запрос.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRAGMA_VALUE_RE = re.compile(r'-?\w+')
+
+
+def get_pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        if value is None or value == '':
+            continue
+        if not PRAGMA_VALUE_RE.fullmatch(name) or not PRAGMA_VALUE_RE.fullmatch(str(value)):
+            raise ImproperlyConfigured(f'Недопустимая прагма SQLite: {name} = {value!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Через сырое соединение, чтобы прагмы не попадали в счётчики запросов
+    for statement in get_pragma_statements(settings.SQLITE_PRAGMAS):
+        connection.connection.execute(statement)
@@ -0,0 +1,220 @@
+"""
+Статика для продакшена.
+
+BundledManifestStorage при collectstatic склеивает вендорные CSS и JS в
+бандлы из settings.STATIC_BUNDLES, добавляет к именам хэш содержимого и
+рядом с каждым файлом кладёт сжатые копии .gz и, если установлен brotli, .br.
+
+StaticFilesMiddleware отдаёт файлы из STATIC_ROOT: файлы с хэшем в имени —
+с Cache-Control immutable на год, сжатую копию — если её принимает браузер.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.eot', '.ttf', '.otf', '.ico')
+# Сжатая копия нужна, только если она заметно меньше оригинала
+MIN_COMPRESSION_RATIO = 0.95
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Файлы без хэша в имени могут поменяться, поэтому кэшируются ненадолго
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+# В порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)')
+CSS_IMPORT_RE = re.compile(r'@import[^;]+;')
+# Карты исходников указывают на файлы рядом с исходником, из бандла они не найдутся
+SOURCE_MAP_RE = re.compile(r'^\s*(?://|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+def rebase_css_urls(content, source_name, bundle_name):
+    """Переписывает относительные url() в стиле source_name так, чтобы они работали из bundle_name."""
+    source_dir = posixpath.dirname(source_name)
+    bundle_dir = posixpath.dirname(bundle_name)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if not url or re.match(r'^([a-z]+:|/|#)', url):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url))
+        return f'url({quote}{posixpath.relpath(target, bundle_dir)}{quote})'
+
+    return CSS_URL_RE.sub(rebase, content)
+
+
+def compress(content):
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+    return {
+        extension: compressed
+        for extension, compressed in variants.items()
+        if len(compressed) < len(content) * MIN_COMPRESSION_RATIO
+    }
+
+
+class BundledManifestStorage(ManifestStaticFilesStorage):
+    def build_bundle(self, bundle_name, source_names):
+        imports, parts = [], []
+        for source_name in source_names:
+            with self.open(source_name) as source_file:
+                content = SOURCE_MAP_RE.sub('', source_file.read().decode('utf-8'))
+            if bundle_name.endswith('.css'):
+                # @import работает только в начале файла
+                imports.extend(CSS_IMPORT_RE.findall(content))
+                content = rebase_css_urls(CSS_IMPORT_RE.sub('', content), source_name, bundle_name)
+                parts.append(f'/* {source_name} */\n{content}')
+            else:
+                parts.append(f'/* {source_name} */\n{content}\n;')
+
+        if self.exists(bundle_name):
+            self.delete(bundle_name)
+        self._save(bundle_name, ContentFile('\n'.join(imports + parts).encode()))
+
+    def compress_files(self, names):
+        for name in names:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(name) as original_file:
+                content = original_file.read()
+            for extension, compressed in compress(content).items():
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for bundle_name, source_names in settings.STATIC_BUNDLES.items():
+                self.build_bundle(bundle_name, source_names)
+                paths[bundle_name] = (self, bundle_name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            self.compress_files(sorted(set(self.hashed_files.values())))
+
+    def url_converter(self, name, hashed_files, template=None):
+        convert = super().url_converter(name, hashed_files, template)
+
+        def convert_or_keep(match):
+            # Вендорные стили ссылаются на шрифты, которых нет в поставке, а то и за пределы статики
+            try:
+                return convert(match)
+            except (ValueError, SuspiciousFileOperation):
+                logger.warning('%s ссылается на несуществующий файл: %s', name, match.group(0))
+                return match.group(0)
+
+        return convert_or_keep
+
+    def stored_name(self, name):
+        # До первого collectstatic манифеста нет, отдаём исходные имена
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def is_collected(self, name):
+        return name in self.hashed_files
+
+
+@dataclass
+class StaticFile:
+    path: str
+    content_type: str
+    mtime: float
+    immutable: bool
+    encodings: dict = field(default_factory=dict)
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for part in header.split(','):
+        encoding, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if quality > 0:
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def index_static_root(static_root, hashed_names):
+    files = {}
+    for directory, _, file_names in os.walk(static_root):
+        for file_name in file_names:
+            if file_name.endswith(tuple(extension for _, extension in ENCODINGS)):
+                continue
+            path = os.path.join(directory, file_name)
+            name = os.path.relpath(path, static_root).replace(os.sep, '/')
+            content_type, _ = mimetypes.guess_type(file_name)
+            files[name] = StaticFile(
+                path=path,
+                content_type=content_type or 'application/octet-stream',
+                mtime=os.path.getmtime(path),
+                immutable=name in hashed_names,
+                encodings={
+                    encoding: path + extension
+                    for encoding, extension in ENCODINGS
+                    if os.path.exists(path + extension)
+                },
+            )
+    return files
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику, не доходя до остальных middleware и вьюх."""
+
+    def __init__(self, get_response):
+        if not settings.SERVE_STATIC:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.files = index_static_root(settings.STATIC_ROOT, hashed_names)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(settings.STATIC_URL):
+            static_file = self.files.get(request.path[len(settings.STATIC_URL):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), static_file.mtime):
+            return HttpResponseNotModified()
+
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((encoding for encoding in static_file.encodings if encoding in encodings), None)
+        path = static_file.encodings[encoding] if encoding else static_file.path
+
+        response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if static_file.encodings:
+            response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(static_file.mtime)
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if static_file.immutable else MUTABLE_CACHE_CONTROL
+        return response
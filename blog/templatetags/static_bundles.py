@@ -0,0 +1,22 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def static_bundle(bundle_name):
+    """Бандл из settings.STATIC_BUNDLES, а при DEBUG или до collectstatic — его исходные файлы по одному."""
+    if not settings.DEBUG and staticfiles_storage.is_collected(bundle_name):
+        urls = [static(bundle_name)]
+    else:
+        urls = [static(source_name) for source_name in settings.STATIC_BUNDLES[bundle_name]]
+
+    if bundle_name.endswith('.css'):
+        tag = '<link rel="stylesheet" href="{}">'
+    else:
+        tag = '<script src="{}"></script>'
+    return format_html_join('\n', tag, ((url,) for url in urls))
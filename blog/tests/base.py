@@ -0,0 +1,19 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from blog import images, likes, pageviews, related
+from blog.benchmarking import LOCAL_CACHES
+
+
+# Реплики смотрят в рабочие файлы, а не в тестовую базу, кэш сайта тестам трогать нельзя
+@override_settings(DATABASE_REPLICA_WEIGHTS={}, PAGE_VIEWS_TRACKED_VIEWS=[], CACHES=LOCAL_CACHES)
+class BlogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Фоновые потоки писали бы в базу мимо транзакции теста, буферы сбрасываем вручную
+        for flusher in (images.flusher, likes.flusher, pageviews.flusher, related.flusher):
+            patcher = mock.patch.object(flusher, 'start')
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,139 @@
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils import timezone
+
+from blog import fake_data
+from blog.models import Comment, Post, Tag
+from blog.tests.base import BlogTestCase
+
+
+class StoredCountersTest(BlogTestCase):
+    """Хранимые счётчики после каждой правки совпадают с посчитанными подзапросами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=10, tags=5, posts=10, likes=30, comments=30, seed=7)
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.popular().first()
+        self.other_post = Post.objects.popular().last()
+        self.user = User.objects.exclude(liked_posts=self.post).first()
+
+    def assert_counters_exact(self):
+        stored = Post.objects.with_counts().values_list('id', 'likes_amount', 'comments_amount')
+        exact = Post.objects.with_counts(exact=True).values_list('id', 'likes_amount', 'comments_amount')
+        self.assertEqual(sorted(stored), sorted(exact))
+
+        tags_counts = Tag.objects.annotate(exact_count=Count('posts')).values_list('posts_count', 'exact_count')
+        for posts_count, exact_count in tags_counts:
+            self.assertEqual(posts_count, exact_count)
+
+    def create_comment(self, post):
+        return Comment.objects.create(post=post, author=self.user, text='Комментарий', published_at=timezone.now())
+
+    def test_generated_data(self):
+        self.assert_counters_exact()
+
+    def test_like_from_post(self):
+        self.post.likes.add(self.user)
+        self.assert_counters_exact()
+
+    def test_like_from_user(self):
+        self.user.liked_posts.add(self.post, self.other_post)
+        self.assert_counters_exact()
+
+    def test_repeated_like(self):
+        self.post.likes.add(self.user)
+        self.post.likes.add(self.user)
+        self.user.liked_posts.add(self.post)
+        self.assert_counters_exact()
+
+    def test_unlike(self):
+        self.post.likes.add(self.user)
+        self.post.likes.remove(self.user)
+        self.assert_counters_exact()
+
+        self.user.liked_posts.add(self.post, self.other_post)
+        self.user.liked_posts.remove(self.other_post)
+        self.assert_counters_exact()
+
+    def test_clear_likes(self):
+        self.post.likes.clear()
+        self.assert_counters_exact()
+
+        self.user.liked_posts.add(self.post, self.other_post)
+        self.user.liked_posts.clear()
+        self.assert_counters_exact()
+
+    def test_comment(self):
+        self.create_comment(self.post)
+        self.assert_counters_exact()
+
+    def test_move_comment(self):
+        comment = self.create_comment(self.post)
+        comment.post = self.other_post
+        comment.save()
+        self.assert_counters_exact()
+
+    def test_delete_comment(self):
+        self.post.comments.first().delete()
+        self.assert_counters_exact()
+
+    def test_delete_post(self):
+        self.post.delete()
+        self.assert_counters_exact()
+
+    def test_delete_user(self):
+        # Вместе с пользователем каскадом удаляются его лайки, комментарии и посты
+        user = User.objects.filter(liked_posts__isnull=False, comment__isnull=False).distinct().first()
+        user.delete()
+        self.assert_counters_exact()
+
+    def test_change_tags(self):
+        tag = Tag.objects.exclude(posts=self.post).first()
+        self.post.tags.add(tag)
+        self.assert_counters_exact()
+
+        tag.posts.remove(self.post)
+        self.assert_counters_exact()
+
+        self.post.tags.clear()
+        tag.posts.clear()
+        self.assert_counters_exact()
+
+    def test_recount_repairs_counters(self):
+        Post.objects.update(likes_count=99, comments_count=99)
+        Post.objects.recount_likes()
+        Post.objects.recount_comments()
+        Tag.objects.update(posts_count=99)
+        Tag.objects.recount_posts()
+        self.assert_counters_exact()
+
+
+class ExactCountsTest(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=10, tags=5, posts=10, likes=30, comments=30, seed=7)
+
+    def test_counts_are_not_multiplied(self):
+        # Два Count через JOIN'ы перемножили бы лайки на комментарии
+        post = Post.objects.popular().first()
+        exact = Post.objects.with_counts(exact=True).get(id=post.id)
+        distinct = Post.objects.annotate(
+            likes_amount=Count('likes', distinct=True),
+            comments_amount=Count('comments', distinct=True),
+        ).get(id=post.id)
+        self.assertGreater(exact.likes_amount, 0)
+        self.assertGreater(exact.comments_amount, 0)
+        self.assertEqual(
+            (exact.likes_amount, exact.comments_amount),
+            (distinct.likes_amount, distinct.comments_amount),
+        )
+
+    def test_counts_use_index_subqueries(self):
+        post = Post.objects.popular().first()
+        plan = Post.objects.with_counts(exact=True).filter(id=post.id).explain()
+        self.assertEqual(plan.count('CORRELATED SCALAR SUBQUERY'), 2, plan)
+        scans = [line for line in plan.splitlines() if ' SCAN ' in f' {line} ']
+        self.assertEqual(scans, [], plan)
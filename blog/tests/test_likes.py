@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+
+from blog import fake_data, likes
+from blog.models import Post, PostQuerySet
+from blog.tests.base import BlogTestCase
+
+Like = likes.Like
+
+
+class LikesBufferTest(BlogTestCase):
+    """Буфер лайков: пачки, их откат и возврат в буфер при ошибке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=10, tags=5, posts=5, likes=10, seed=3)
+
+    def setUp(self):
+        super().setUp()
+        self.reset_buffer()
+        self.addCleanup(self.reset_buffer)
+        self.post = Post.objects.popular().first()
+        self.users = list(User.objects.exclude(liked_posts=self.post)[:3])
+        self.key = (self.post.id, self.users[0].id)
+
+    def reset_buffer(self):
+        with likes._lock:
+            likes._pending.clear()
+            likes._in_flight.clear()
+            likes._deltas.clear()
+
+    def get_likes_count(self):
+        return Post.objects.values_list('likes_count', flat=True).get(id=self.post.id)
+
+    def assert_buffer(self, pending, delta):
+        self.assertEqual(likes._pending, pending)
+        self.assertEqual(likes._in_flight, {})
+        self.assertEqual(likes.get_pending_delta(self.post.id), delta)
+
+    def test_last_intention_wins(self):
+        self.assertTrue(likes.toggle_like(*self.key))
+        self.assert_buffer({self.key: True}, 1)
+
+        # Повторный лайк ничего не меняет, снятие отменяет ещё не записанный лайк
+        self.assertFalse(likes.set_like(*self.key, True))
+        self.assertFalse(likes.toggle_like(*self.key))
+        self.assert_buffer({}, 0)
+
+    def test_flush_writes_batches(self):
+        likes_count = self.get_likes_count()
+        for user in self.users:
+            likes.set_like(self.post.id, user.id, True)
+
+        flushed = [likes.flush_batch(2), likes.flush_batch(2), likes.flush_batch(2)]
+
+        self.assertEqual(flushed, [2, 1, 0])
+        self.assert_buffer({}, 0)
+        self.assertEqual(self.get_likes_count(), likes_count + 3)
+        self.assertEqual(Like.objects.filter(post=self.post, user__in=self.users).count(), 3)
+
+    def test_flush_removes_likes(self):
+        self.post.likes.add(*self.users)
+        likes_count = self.get_likes_count()
+        for user in self.users[:2]:
+            likes.toggle_like(self.post.id, user.id)
+        self.assertEqual(likes.get_likes_amount(self.post.id), likes_count - 2)
+
+        self.assertEqual(likes.flush(), 2)
+
+        self.assert_buffer({}, 0)
+        self.assertEqual(self.get_likes_count(), likes_count - 2)
+        liked_user_ids = Like.objects.filter(post=self.post, user__in=self.users).values_list('user', flat=True)
+        self.assertEqual(list(liked_user_ids), [self.users[2].id])
+
+    def test_generation_after_flush(self):
+        generation = likes._generation
+        likes.set_like(*self.key, True)
+        likes.flush()
+        self.assertEqual(likes._generation, generation + 1)
+
+        # Буфер пуст, значит снова спрашиваем базу, а там лайк уже есть
+        self.assertFalse(likes.toggle_like(*self.key))
+        self.assert_buffer({self.key: False}, -1)
+
+    def test_failed_batch_returns_to_buffer(self):
+        likes_count = self.get_likes_count()
+        likes.set_like(*self.key, True)
+
+        with mock.patch.object(likes, 'apply_batch', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                likes.flush_batch(10)
+
+        self.assert_buffer({self.key: True}, 1)
+        self.assertEqual(self.get_likes_count(), likes_count)
+        self.assertEqual(likes.flush(), 1)
+        self.assertEqual(self.get_likes_count(), likes_count + 1)
+
+    def test_failed_batch_keeps_newer_intention(self):
+        likes.set_like(*self.key, True)
+
+        def change_mind_and_fail(batch):
+            # Пока пачка в полёте, лайк учтён в ней, и снятие ложится в буфер отдельно
+            self.assertEqual(likes._in_flight, {self.key: True})
+            self.assertFalse(likes.toggle_like(*self.key))
+            self.assertEqual(likes._pending, {self.key: False})
+            raise DatabaseError
+
+        with mock.patch.object(likes, 'apply_batch', side_effect=change_mind_and_fail):
+            with self.assertRaises(DatabaseError):
+                likes.flush_batch(10)
+
+        # В базе лайка нет, и пользователь его уже снял: записывать нечего
+        self.assert_buffer({}, 0)
+        self.assertFalse(Like.objects.filter(post_id=self.key[0], user_id=self.key[1]).exists())
+
+    def test_failed_apply_rolls_back(self):
+        likes_count = self.get_likes_count()
+        likes.set_like(*self.key, True)
+
+        with mock.patch.object(PostQuerySet, 'recount_likes', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                likes.flush()
+
+        self.assertFalse(Like.objects.filter(post_id=self.key[0], user_id=self.key[1]).exists())
+        self.assertEqual(self.get_likes_count(), likes_count)
+        self.assert_buffer({self.key: True}, 1)
+
+    def test_deleted_post_is_skipped(self):
+        other_post = Post.objects.exclude(id=self.post.id).first()
+        likes.set_like(other_post.id, self.users[0].id, True)
+        likes.set_like(*self.key, True)
+        other_post.delete()
+
+        self.assertEqual(likes.flush(), 2)
+
+        self.assertEqual(likes.get_buffer_size(), 0)
+        self.assertTrue(Like.objects.filter(post_id=self.key[0], user_id=self.key[1]).exists())
@@ -0,0 +1,127 @@
+import datetime
+from unittest import mock
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from blog import fake_data, pageviews
+from blog.models import PageViewCount, Post
+from blog.tests.base import BlogTestCase
+
+
+class PageViewsFlushTest(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=2, tags=2, posts=2, seed=5)
+
+    def setUp(self):
+        super().setUp()
+        self.reset_buffer()
+        self.addCleanup(self.reset_buffer)
+        self.post = Post.objects.first()
+        self.path = f'/post/{self.post.slug}'
+
+    def reset_buffer(self):
+        with pageviews._lock:
+            pageviews._counts.clear()
+            pageviews._post_slugs.clear()
+
+    def record_at(self, minute, path, post_slug=None):
+        with mock.patch('django.utils.timezone.now', return_value=minute):
+            pageviews.record(path, post_slug)
+
+    def get_views(self):
+        rows = PageViewCount.objects.values_list('path', 'minute', 'views')
+        return {(path, minute): views for path, minute, views in rows}
+
+    def test_flush_sums_by_minute(self):
+        minute = timezone.now().replace(second=0, microsecond=0)
+        next_minute = minute + datetime.timedelta(minutes=1)
+        self.record_at(minute + datetime.timedelta(seconds=5), self.path, self.post.slug)
+        self.record_at(minute + datetime.timedelta(seconds=59), self.path, self.post.slug)
+        self.record_at(next_minute, self.path, self.post.slug)
+        self.record_at(minute, '/')
+        self.assertEqual(pageviews.get_buffer_size(), 4)
+
+        self.assertEqual(pageviews.flush(), 4)
+        self.assertEqual(pageviews.get_buffer_size(), 0)
+        self.assertEqual(self.get_views(), {(self.path, minute): 2, (self.path, next_minute): 1, ('/', minute): 1})
+        post_ids = PageViewCount.objects.filter(path=self.path).values_list('post', flat=True)
+        self.assertEqual(set(post_ids), {self.post.id})
+        self.assertIsNone(PageViewCount.objects.get(path='/').post_id)
+
+        # Та же минута в следующей пачке прибавляется к записанной строке
+        self.record_at(minute, self.path, self.post.slug)
+        self.assertEqual(pageviews.flush(), 1)
+        self.assertEqual(self.get_views()[(self.path, minute)], 3)
+        self.assertEqual(pageviews.flush(), 0)
+
+    def test_failed_flush_returns_views(self):
+        minute = timezone.now().replace(second=0, microsecond=0)
+        self.record_at(minute, self.path, self.post.slug)
+
+        def record_and_fail():
+            # Пока пачка пишется, в новый буфер приходят просмотры той же минуты
+            self.record_at(minute, self.path)
+            raise DatabaseError
+
+        with mock.patch.object(pageviews, '_get_upsert_sql', side_effect=record_and_fail):
+            with self.assertRaises(DatabaseError):
+                pageviews.flush()
+
+        self.assertEqual(PageViewCount.objects.count(), 0)
+        self.assertEqual(pageviews.get_buffer_size(), 2)
+        self.assertEqual(pageviews.flush(), 2)
+        self.assertEqual(self.get_views(), {(self.path, minute): 2})
+        self.assertEqual(PageViewCount.objects.get().post_id, self.post.id)
+
+
+class PageViewsCompactTest(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=2, tags=2, posts=2, seed=5)
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.first()
+        self.path = f'/post/{self.post.slug}'
+        self.midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(days=3)
+
+    def add_views(self, minute, views, post=None):
+        PageViewCount.objects.create(path=self.path, minute=minute, post=post, views=views)
+
+    def get_views(self):
+        return dict(PageViewCount.objects.values_list('minute', 'views'))
+
+    def test_compact_splits_by_day(self):
+        before_midnight = self.midnight - datetime.timedelta(minutes=1)
+        self.add_views(before_midnight - datetime.timedelta(hours=5), 1, self.post)
+        self.add_views(before_midnight, 2)
+        self.add_views(self.midnight, 4)
+        self.add_views(self.midnight + datetime.timedelta(minutes=1), 8)
+        self.add_views(self.midnight + datetime.timedelta(hours=2), 16)
+
+        # Минута, с которой начинается before, остаётся поминутной
+        removed = pageviews.compact(self.midnight + datetime.timedelta(hours=2))
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(self.get_views(), {
+            self.midnight - datetime.timedelta(days=1): 3,
+            self.midnight: 12,
+            self.midnight + datetime.timedelta(hours=2): 16,
+        })
+        day_before = PageViewCount.objects.get(minute=self.midnight - datetime.timedelta(days=1))
+        self.assertEqual(day_before.post_id, self.post.id)
+
+    def test_repeated_compact_merges_daily_rows(self):
+        self.add_views(self.midnight + datetime.timedelta(minutes=1), 1)
+        pageviews.compact(self.midnight + datetime.timedelta(hours=1))
+        self.add_views(self.midnight + datetime.timedelta(hours=1), 2)
+        self.add_views(self.midnight + datetime.timedelta(days=1), 4)
+
+        # Дневная строка прошлой свёртки сворачивается вместе с новыми минутами того же дня
+        removed = pageviews.compact(self.midnight + datetime.timedelta(days=2))
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(self.get_views(), {self.midnight: 3, self.midnight + datetime.timedelta(days=1): 4})
+        self.assertEqual(pageviews.compact(self.midnight + datetime.timedelta(days=2)), 0)
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.urls import reverse
+
+from blog import archive, fake_data
+from blog.models import Post, Tag
+from blog.tests.base import BlogTestCase
+
+# Сколько SQL-запросов делает страница при холодном кэше,
+# включая два запроса валидаторов условного GET и сборку сайдбара
+QUERY_BUDGETS = {
+    'index': 9,
+    'post_detail': 11,
+    'tag_filter': 10,
+    'archive_month': 10,
+}
+
+
+class QueryBudgetTest(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=20, tags=10, posts=10, likes=30, comments=30, seed=10)
+
+    def get_urls(self):
+        post = Post.objects.fresh().first()
+        tag = Tag.objects.popular()[0]
+        return {
+            'index': reverse('index'),
+            'post_detail': reverse('post_detail', kwargs={'slug': post.slug}),
+            'tag_filter': reverse('tag_filter', kwargs={'tag_title': tag.title}),
+            'archive_month': reverse('archive_month', args=archive.get_month(post.published_at)),
+        }
+
+    def assert_within_budgets(self):
+        for view, url in self.get_urls().items():
+            with self.subTest(view=view):
+                cache.clear()
+                with self.assertNumQueries(QUERY_BUDGETS[view]):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_small_database(self):
+        self.assert_within_budgets()
+
+    def test_queries_do_not_grow_with_database(self):
+        fake_data.generate(posts=300, likes=900, comments=900, seed=300)
+        self.assert_within_budgets()
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import override_settings
+
+from blog import fake_data, related
+from blog.models import Post, RelatedPost, Tag
+from blog.tests.base import BlogTestCase
+
+
+@override_settings(RELATED_POSTS_AMOUNT=3)
+class RelatedPostsUpdateTest(BlogTestCase):
+    """Пересчёт части списков совпадает с пересборкой целиком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=5, tags=6, posts=40, likes=60, seed=11)
+
+    def setUp(self):
+        super().setUp()
+        self.reset_buffer()
+        self.addCleanup(self.reset_buffer)
+        related.rebuild()
+        self.post = Post.objects.filter(related_to__isnull=False).distinct().first()
+
+    def reset_buffer(self):
+        with related._lock:
+            related._pending_ids.clear()
+
+    def get_lists(self, post_ids=None):
+        rows = RelatedPost.objects.order_by('post', 'rank')
+        if post_ids is not None:
+            rows = rows.filter(post__in=post_ids)
+        lists = {}
+        for post_id, related_id in rows.values_list('post', 'related'):
+            lists.setdefault(post_id, []).append(related_id)
+        return lists
+
+    def assert_updated_like_rebuild(self, post_ids):
+        """Списки post_ids и постов, где они стояли, такие же, как после пересборки."""
+        checked_ids = set(post_ids) | related.get_referrer_ids(post_ids)
+        related.update_posts(post_ids)
+        updated = self.get_lists(checked_ids)
+        related.rebuild()
+        self.assertEqual(updated, self.get_lists(checked_ids))
+        return updated
+
+    def test_added_tag(self):
+        tag = Tag.objects.exclude(posts=self.post).first()
+        self.post.tags.add(tag)
+        self.assert_updated_like_rebuild([self.post.id])
+
+    def test_removed_tag(self):
+        self.post.tags.remove(self.post.tags.first())
+        self.assert_updated_like_rebuild([self.post.id])
+
+    def test_removed_all_tags(self):
+        self.post.tags.clear()
+        updated = self.assert_updated_like_rebuild([self.post.id])
+        self.assertNotIn(self.post.id, updated)
+        self.assertFalse(RelatedPost.objects.filter(related=self.post).exists())
+
+    def test_likes_change_order(self):
+        # Ничья по тегам решается популярностью
+        last_related = RelatedPost.objects.filter(post=self.post).order_by('-rank').first().related
+        Post.objects.filter(id=last_related.id).update(likes_count=10 ** 6)
+        self.assert_updated_like_rebuild([last_related.id])
+
+    def test_many_posts_rebuild_everything(self):
+        with mock.patch.object(related, 'MAX_UPDATE_POSTS', 1), mock.patch.object(related, 'rebuild') as rebuild:
+            related.update_posts([self.post.id])
+        rebuild.assert_called_once_with(3)
+
+    def test_tags_change_queues_update(self):
+        tag = Tag.objects.exclude(posts=self.post).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.remove(self.post.tags.first())
+            self.post.tags.add(tag)
+        self.assertEqual(related._pending_ids, {self.post.id})
+
+        with mock.patch.object(related, 'update_posts', return_value=1) as update_posts:
+            self.assertEqual(related.flush(), 1)
+        update_posts.assert_called_once_with({self.post.id})
+        self.assertEqual(related._pending_ids, set())
+        self.assertEqual(related.flush(), 0)
+
+    def test_failed_flush_requeues(self):
+        related.queue_update([self.post.id])
+
+        def queue_and_fail(post_ids):
+            related.queue_update([0])
+            raise DatabaseError
+
+        with mock.patch.object(related, 'update_posts', side_effect=queue_and_fail):
+            with self.assertRaises(DatabaseError):
+                related.flush()
+
+        self.assertEqual(related._pending_ids, {self.post.id, 0})
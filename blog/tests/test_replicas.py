@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from blog import replicas
+
+
+class ReadFromDefaultTest(SimpleTestCase):
+    def route(self):
+        return replicas.ReplicaRouter().db_for_read(None)
+
+    def test_cached_data_is_read_from_default(self):
+        state = replicas.RequestState(use_replica=True, alias='replica')
+        token = replicas._request_state.set(state)
+        self.addCleanup(replicas._request_state.reset, token)
+
+        self.assertEqual(self.route(), 'replica')
+        with replicas.read_from_default():
+            self.assertIsNone(self.route())
+        self.assertEqual(self.route(), 'replica')
+
+    def test_outside_replica_views(self):
+        with replicas.read_from_default():
+            self.assertIsNone(self.route())
+
+        token = replicas._request_state.set(replicas.RequestState())
+        self.addCleanup(replicas._request_state.reset, token)
+        with replicas.read_from_default():
+            self.assertIsNone(self.route())
+        self.assertFalse(replicas._request_state.get().use_replica)
@@ -0,0 +1,38 @@
+from django.urls import reverse
+
+from blog import fake_data
+from blog.models import Post, Tag
+from blog.tests.base import BlogTestCase
+
+
+class SitemapTest(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.generate(users=2, tags=3, posts=5, seed=9)
+        Tag.objects.create(title='два слова')
+        Tag.objects.create(title='python-3')
+
+    def get_content(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_tags_without_url_are_skipped(self):
+        content = self.get_content(reverse('sitemap_section', args=['tags-1'])).decode()
+        self.assertIn(reverse('tag_filter', args=['python-3']), content)
+        self.assertNotIn('два слова', content)
+        self.assertEqual(content.count('<url>'), Tag.objects.count() - 1)
+
+    def test_posts_are_split_by_id(self):
+        content = self.get_content(reverse('sitemap_section', args=['posts-1'])).decode()
+        self.assertEqual(content.count('<url>'), Post.objects.count())
+        self.assertEqual(self.client.get(reverse('sitemap_section', args=['posts-2'])).status_code, 404)
+
+    def test_feed_description_is_teaser(self):
+        post = Post.objects.fresh().first()
+        post.text = 'Анонс. ' * 100
+        post.save()
+
+        content = self.get_content(reverse('feed', args=['rss'])).decode()
+        self.assertIn(f'<description>{post.teaser}</description>', content)
+        self.assertNotIn(post.text[:300], content)
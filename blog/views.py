@@ -1,147 +1,232 @@
-from django.shortcuts import render, get_object_or_404
-from blog.models import Comment, Post, Tag
-from django.db.models import Count, Prefetch
-
-
-def serialize_tag(tag):
-    return {
-        'title': tag.title,
-        'posts_with_tag': tag.posts_count,
-    }
-
-
-def serialize_post(post):
-    return {
-        'title': post.title,
-        'teaser_text': post.text[:200],
-        'author': post.author.username,
-        'comments_amount': post.comments_count,
-        'image_url': post.image.url if post.image else None,
-        'published_at': post.published_at,
-        'slug': post.slug,
-        'tags': [serialize_tag(tag) for tag in getattr(post, 'annotated_tags', [])],
-        'first_tag_title': post.tags.first().title if post.tags.exists() else None,
-    }
-
-
-
-def add_comments_count(posts):
-    post_ids = [post.id for post in posts]
-    posts_with_comments = (
-        Post.objects.filter(id__in=post_ids)
-        .annotate(comments_count=Count('comments', distinct=False))
-    )
-    comments_count_map = {post.id: post.comments_count for post in posts_with_comments}
-    for post in posts:
-        post.comments_count = comments_count_map.get(post.id, 0)
-    return posts
-
-
+import datetime
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+from blog import search as post_search
+from blog import likes, pageviews, profiling, related, sidebar
+from blog.conditional import conditional_page, get_post_last_modified, get_site_last_modified
+from blog.images import serialize_image
+from blog.models import ArchiveMonth, Comment, Post, Tag
+from blog.pagination import get_page_cursor, paginate_keyset
+from blog.replicas import pin_to_default, use_replica
+from blog.serializers import serialize_comment, serialize_post, serialize_tag
+
+INDEX_POSTS_PER_PAGE = 5
+COMMENTS_PER_PAGE = 20
+SEARCH_RESULTS_PER_PAGE = 20
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
 def index(request):
-    most_popular_tags = Tag.objects.popular()
-
-    most_popular_posts = (
-        Post.objects.popular()
-        .select_related('author')
-        .prefetch_related('tags')
-        .fetch_with_comments_count()[:5]
-    )
     most_fresh_posts = (
         Post.objects.fresh()
+        # Карточкам хватает teaser, полный текст читает только страница поста
+        .defer('text')
+        .with_counts()
         .select_related('author')
         .prefetch_related(Tag.objects.prefetch_with_post_count())
-        .annotate(comments_count=Count('comments', distinct=False))[:5]
     )
+    page = paginate_keyset(most_fresh_posts, request.GET.get('cursor'), per_page=INDEX_POSTS_PER_PAGE)
 
     context = {
-        'most_popular_posts': [
-            serialize_post(post) for post in most_popular_posts
-        ],
-        'page_posts': [serialize_post(post) for post in most_fresh_posts],
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
+        'page_posts': [serialize_post(post) for post in page.items],
+        'page': page,
+        **sidebar.get_sidebar(),
     }
     return render(request, 'index.html', context)
 
 
-def post_detail(request, slug):
-    post = get_object_or_404(
-        Post.objects
-        .select_related('author')
-        .annotate(likes_amount=Count('likes'), comments_count=Count('comments')),
-        slug=slug
+def index_page(request, page):
+    """Старые адреса /page/N ведут на ту же страницу главной с курсором."""
+    cursor = get_page_cursor(Post.objects.all(), page, INDEX_POSTS_PER_PAGE)
+    url = reverse('index')
+    if cursor:
+        url = f'{url}?cursor={cursor}'
+    return redirect(url, permanent=True)
+
+
+def get_comments_page(post, cursor):
+    return paginate_keyset(
+        post.comments.select_related('author'),
+        cursor,
+        per_page=COMMENTS_PER_PAGE,
+        ordering=('published_at', 'id'),
     )
-    comments = post.comments.select_related('author')
-    related_tags = post.tags.annotate(posts_count=Count('posts'))
-
-    serialized_comments = [
-        {
-            'text': comment.text,
-            'published_at': comment.published_at,
-            'author': comment.author.username,
-        }
-        for comment in comments
-    ]
+
+
+@use_replica
+# Токен нужен сердечку, которое лайкает пост без перезагрузки страницы
+@ensure_csrf_cookie
+@conditional_page(get_post_last_modified)
+def post_detail(request, slug):
+    post = get_object_or_404(Post.objects.with_counts().select_related('author'), slug=slug)
+    comments_page = get_comments_page(post, cursor=None)
+    related_tags = post.tags.all()
 
     serialized_post = {
         'title': post.title,
         'text': post.text,
         'author': post.author.username,
-        'comments': serialized_comments,
-        'likes_amount': post.likes_amount,
-        'image_url': post.image.url if post.image else None,
+        'comments': [serialize_comment(comment) for comment in comments_page.items],
+        'comments_amount': post.comments_amount,
+        'comments_next_cursor': comments_page.next_cursor,
+        # Лайки из буфера ещё не попали в likes_count
+        'likes_amount': post.likes_amount + likes.get_pending_delta(post.id),
         'published_at': post.published_at,
         'slug': post.slug,
         'tags': [serialize_tag(tag) for tag in related_tags],
+        **serialize_image(post),
     }
 
-    most_popular_tags = Tag.objects.annotate(posts_count=Count('posts')).popular()
-    popular_posts_with_likes = (
-        Post.objects
-        .annotate(like_count=Count('likes', distinct=False))
-        .order_by('-like_count')[:5]
-    )
-
-    popular_posts_with_likes =  add_comments_count(popular_posts_with_likes)
     context = {
         'post': serialized_post,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
-        'most_popular_posts': [
-            serialize_post(post) for post in popular_posts_with_likes
-        ],
+        'related_posts': related.get_related_posts(post),
+        **sidebar.get_sidebar(),
     }
     return render(request, 'post-details.html', context)
 
 
+@use_replica
+def post_comments(request, slug):
+    post = get_object_or_404(Post.objects.only('id'), slug=slug)
+    page = get_comments_page(post, request.GET.get('cursor'))
+    return JsonResponse({
+        'comments': [serialize_comment(comment) for comment in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@require_POST
+def like_post(request, slug):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Лайкать могут только вошедшие пользователи'}, status=403)
+    action = request.POST.get('action', 'like')
+    post_id = get_object_or_404(Post.objects.values_list('id', flat=True), slug=slug)
+    # Страница поста общая для всех, поэтому сердечко не знает, лайкал ли пользователь, и переключает
+    if action == 'toggle':
+        liked = likes.toggle_like(post_id, request.user.id)
+    else:
+        liked = action != 'unlike'
+        likes.set_like(post_id, request.user.id, liked)
+    # После записи буфера автор клика должен читать свой лайк с основной базы
+    pin_to_default(settings.LIKES_FLUSH_INTERVAL)
+    return JsonResponse({
+        'liked': liked,
+        'likes_amount': likes.get_likes_amount(post_id),
+    })
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
 def tag_filter(request, tag_title):
-    tag = get_object_or_404(Tag.objects.annotate(posts_count=Count('posts')), title=tag_title)
+    tag = get_object_or_404(Tag, title=tag_title)
 
-    most_popular_tags = Tag.objects.popular()
-    most_popular_posts_with_likes = (
-        Post.objects.annotate(like_count=Count('likes', distinct=False))
-        .order_by('-like_count')[:5]
+    related_posts = (
+        Post.objects.with_tag(tag).fresh()
+        .defer('text')
+        .with_counts()
+        .select_related('author')
+        .prefetch_related(Tag.objects.prefetch_with_post_count())
     )
+    page = paginate_keyset(related_posts, request.GET.get('cursor'), per_page=20)
 
-    most_popular_posts_with_likes = add_comments_count(most_popular_posts_with_likes)
+    context = {
+        'tag': tag.title,
+        'posts': [serialize_post(post) for post in page.items],
+        'page': page,
+        **sidebar.get_sidebar(),
+    }
+    return render(request, 'posts-list.html', context)
 
-    related_posts = (
-        tag.posts
+
+def render_archive(request, posts, archive_title):
+    posts = (
+        posts
+        .defer('text')
+        .with_counts()
         .select_related('author')
         .prefetch_related(Tag.objects.prefetch_with_post_count())
-        .annotate(comments_count=Count('comments')).all()[:20]
     )
+    page = paginate_keyset(posts, request.GET.get('cursor'), per_page=20)
 
     context = {
-        'tag': tag.title,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
-        'posts': [serialize_post(post) for post in related_posts],
-        'most_popular_posts': [
-            serialize_post(post) for post in most_popular_posts_with_likes
+        'archive_title': archive_title,
+        'posts': [serialize_post(post) for post in page.items],
+        'page': page,
+        **sidebar.get_sidebar(),
+    }
+    return render(request, 'posts-list.html', context)
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
+def archive_year(request, year):
+    if not ArchiveMonth.objects.filter(year=year).exists():
+        raise Http404('В этом году постов нет')
+    return render_archive(request, Post.objects.year(year), str(year))
+
+
+@use_replica
+@conditional_page(get_site_last_modified)
+def archive_month(request, year, month):
+    if not ArchiveMonth.objects.filter(year=year, month=month).exists():
+        raise Http404('В этом месяце постов нет')
+    month_start = datetime.date(year, month, 1)
+    return render_archive(request, Post.objects.month(year, month), format_date(month_start, 'F Y'))
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    found_posts = (
+        Post.objects
+        .defer('text')
+        .with_counts()
+        .select_related('author')
+        .prefetch_related(Tag.objects.prefetch_with_post_count())
+    )
+    page = post_search.search_page(
+        found_posts,
+        query,
+        request.GET.get('cursor'),
+        per_page=SEARCH_RESULTS_PER_PAGE,
+    )
+
+    context = {
+        'query': query,
+        'posts': [
+            {**serialize_post(post), 'snippet': getattr(post, 'snippet', None)}
+            for post in page.items
         ],
+        'page': page,
+        **sidebar.get_sidebar(),
     }
     return render(request, 'posts-list.html', context)
 
 
 def contacts(request):
-    # позже здесь будет код для статистики заходов на эту страницу
-    # и для записи фидбека
-    return render(request, 'contacts.html', {})
\ No newline at end of file
+    # заходы на страницу считает PageViewMiddleware,
+    # позже здесь будет код для записи фидбека
+    return render(request, 'contacts.html', {})
+
+
+@staff_member_required
+def profiling_stats(request):
+    return JsonResponse(profiling.get_stats())
+
+
+@staff_member_required
+def page_views_report(request):
+    try:
+        days = max(int(request.GET.get('days', 7)), 1)
+    except ValueError:
+        days = 7
+    return JsonResponse(pageviews.get_report(timezone.now() - datetime.timedelta(days=days)))
@@ -1,4 +1,6 @@
 import os
+
+import django
 from environs import Env
 
 env = Env()
@@ -19,12 +21,16 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'blog',
+    'blog.apps.StaticFilesConfig',
+    'blog.apps.BlogConfig',
 ]
 
 MIDDLEWARE = [
+    'blog.staticfiles.StaticFilesMiddleware',
+    'blog.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'blog.replicas.ReplicaMiddleware',
+    'blog.pageviews.PageViewMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -39,14 +45,56 @@ TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
-STATIC_ROOT = ''
+STATIC_ROOT = env.str('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+# Отдавать собранную статику из STATIC_ROOT самим, см. blog/staticfiles.py
+SERVE_STATIC = env.bool('SERVE_STATIC', not DEBUG)
+
+# Склеиваются при collectstatic, в шаблонах подключаются тегом static_bundle
+STATIC_BUNDLES = {
+    'bundles/site.css': [
+        'vendors/bootstrap/bootstrap.min.css',
+        'vendors/fontawesome/css/all.min.css',
+        'vendors/themify-icons/themify-icons.css',
+        'vendors/linericon/style.css',
+        'vendors/owl-carousel/owl.theme.default.min.css',
+        'vendors/owl-carousel/owl.carousel.min.css',
+        'css/style.css',
+    ],
+    'bundles/site.js': [
+        'vendors/jquery/jquery-3.2.1.min.js',
+        'vendors/bootstrap/bootstrap.bundle.min.js',
+        'vendors/owl-carousel/owl.carousel.min.js',
+        'js/jquery.ajaxchimp.min.js',
+        'js/mail-script.js',
+        'js/main.js',
+    ],
+}
+
+_staticfiles_backend = 'blog.staticfiles.BundledManifestStorage'
+if django.VERSION >= (4, 2):
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': _staticfiles_backend},
+    }
+else:
+    STATICFILES_STORAGE = _staticfiles_backend
+
+_template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Шаблоны разбираются один раз на процесс, а не на каждый рендер
+    _template_loaders = [('django.template.loaders.cached.Loader', _template_loaders)]
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'blog.profiling.ProfilingDjangoTemplates',
+        # Без NAME движок назывался бы profiling, а не django
+        'NAME': 'django',
         'DIRS': [TEMPLATE_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': _template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -64,9 +112,77 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': env.str(
             'DATABASE_FILEPATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения: replica, replica2, ... См. blog/replicas.py
+DATABASE_REPLICA_WEIGHTS = {}
+_replica_paths = env.list('DATABASE_REPLICA_FILEPATHS', [])
+_replica_weights = env.list('DATABASE_REPLICA_WEIGHTS', [1] * len(_replica_paths), subcast=int)
+for _number, (_path, _weight) in enumerate(zip(_replica_paths, _replica_weights), start=1):
+    _alias = 'replica' if _number == 1 else f'replica{_number}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': _path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICA_WEIGHTS[_alias] = _weight
+
+# round-robin — по кругу с учётом весов, random — случайно пропорционально весам
+DATABASE_REPLICA_POLICY = env.str('DATABASE_REPLICA_POLICY', 'round-robin')
+# Сколько секунд после записи пользователь читает с основной базы
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', 10)
+# На сколько секунд выключать недоступную реплику
+REPLICA_RETRY_SECONDS = env.int('REPLICA_RETRY_SECONDS', 30)
+
+DATABASE_ROUTERS = ['blog.replicas.ReplicaRouter']
+
+# Применяются к каждому новому соединению, см. blog/sqlite.py. Пустое значение — не трогать
+SQLITE_PRAGMAS = {
+    # В WAL читатели не ждут писателя, а писатель — читателей
+    'journal_mode': env.str('SQLITE_JOURNAL_MODE', 'wal'),
+    # В WAL так безопасно: при сбое питания теряется только последняя транзакция
+    'synchronous': env.str('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+    # Отрицательное значение — размер в КиБ, а не в страницах
+    'cache_size': env.int('SQLITE_CACHE_SIZE', -64000),
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', 5000),
+    'temp_store': env.str('SQLITE_TEMP_STORE', 'memory'),
+}
+
+# Лайки копятся в памяти процесса и пишутся в базу пачками, см. blog/likes.py
+LIKES_FLUSH_INTERVAL = env.float('LIKES_FLUSH_INTERVAL', 1.0)
+LIKES_FLUSH_BATCH_SIZE = env.int('LIKES_FLUSH_BATCH_SIZE', 500)
+
+# Просмотры страниц копятся в памяти процесса, см. blog/pageviews.py.
+# При жёстком убийстве воркера теряется не больше одного интервала
+PAGE_VIEWS_FLUSH_INTERVAL = env.float('PAGE_VIEWS_FLUSH_INTERVAL', 10.0)
+PAGE_VIEWS_TRACKED_VIEWS = env.list(
+    'PAGE_VIEWS_TRACKED_VIEWS',
+    ['index', 'post_detail', 'tag_filter', 'search', 'contacts'],
+)
+
+# Копии новых картинок постов создаются в фоне раз в столько секунд, см. blog/images.py
+IMAGE_DERIVATIVES_INTERVAL = env.float('IMAGE_DERIVATIVES_INTERVAL', 2.0)
+
+# Сколько похожих постов хранить и показывать у поста, см. blog/related.py
+RELATED_POSTS_AMOUNT = env.int('RELATED_POSTS_AMOUNT', 5)
+# Списки постов с изменёнными тегами пересчитываются в фоне раз в столько секунд
+RELATED_POSTS_UPDATE_INTERVAL = env.float('RELATED_POSTS_UPDATE_INTERVAL', 10.0)
+
+# Искать ли по тексту комментариев. Индекс растёт, а каждый комментарий переиндексирует пост
+SEARCH_INDEX_COMMENTS = env.bool('SEARCH_INDEX_COMMENTS', False)
+
+CACHES = {
+    # Версии сайдбара и лидерборда, ETag и Last-Modified должны быть общими для всех воркеров,
+    # поэтому по умолчанию кэш в файлах, а не в памяти процесса
+    'default': env.dj_cache_url('CACHE_URL', f'file://{os.path.join(BASE_DIR, "cache")}'),
+    # Для тега {% cache %}: карточки постов. Ключи версионные, старые просто истекают
+    'template_fragments': env.dj_cache_url('FRAGMENT_CACHE_URL', 'locmem://template-fragments'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',  # noqa: E501
@@ -97,34 +213,90 @@ STATIC_URL = '/static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Профилирование запросов, см. blog/profiling.py
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', True)
+# Доля запросов, в которых ищутся повторяющиеся SQL-запросы
+PROFILING_SQL_SAMPLE_RATE = env.float('PROFILING_SQL_SAMPLE_RATE', 0.05)
+PROFILING_SLOW_QUERY_MS = env.float('PROFILING_SLOW_QUERY_MS', 100)
+# Столько одинаковых SQL-запросов за запрос считаются N+1
+PROFILING_DUPLICATE_QUERY_THRESHOLD = env.int('PROFILING_DUPLICATE_QUERY_THRESHOLD', 5)
+PROFILING_WINDOW_SECONDS = env.int('PROFILING_WINDOW_SECONDS', 600)
+
 DEBUG_TOOLBAR_CONFIG = {
     'SHOW_TOOLBAR_CALLBACK': lambda request: True,
 }
 
+LOG_LEVEL = env.str('LOG_LEVEL', 'INFO')
+# SQL пишется в лог только при DEBUG=True и LOG_SQL_LEVEL=DEBUG
+LOG_SQL_LEVEL = env.str('LOG_SQL_LEVEL', 'INFO')
+LOG_SQL_SAMPLE_RATE = env.float('LOG_SQL_SAMPLE_RATE', 0.01)
+LOG_REQUEST_SAMPLE_RATE = env.float('LOG_REQUEST_SAMPLE_RATE', 0.1)
+LOG_FILE = env.str('LOG_FILE', os.path.join(BASE_DIR, 'debug.log'))
+LOG_FILE_MAX_BYTES = env.int('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024)
+# Например midnight — ротация по времени вместо ротации по размеру
+LOG_FILE_ROTATE_WHEN = env.str('LOG_FILE_ROTATE_WHEN', '')
+LOG_FILE_BACKUP_COUNT = env.int('LOG_FILE_BACKUP_COUNT', 5)
+
+if LOG_FILE_ROTATE_WHEN:
+    _log_file_rotation = {
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': LOG_FILE_ROTATE_WHEN,
+    }
+else:
+    _log_file_rotation = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'maxBytes': LOG_FILE_MAX_BYTES,
+    }
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'filters': {
+        'sample_sql': {
+            '()': 'blog.log.SamplingFilter',
+            'rate': LOG_SQL_SAMPLE_RATE,
+        },
+        'sample_requests': {
+            '()': 'blog.log.SamplingFilter',
+            'rate': LOG_REQUEST_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'console': {
-            'level': 'DEBUG',  # Уровень логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-            'class': 'logging.StreamHandler',  # Вывод в консоль
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
         },
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',  # Вывод в файл
-            'filename': 'debug.log',  # Имя файла для логов
+            **_log_file_rotation,
+            'filename': LOG_FILE,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'verbose',
+        },
+        # Пишет в console и file из отдельного потока, см. blog/log.py
+        'queue': {
+            'class': 'blog.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
         },
     },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
     'loggers': {
-        '': {  # Корневой логгер (все логи)
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
+        'django.db.backends': {
+            'level': LOG_SQL_LEVEL,
+            'filters': ['sample_sql'],
         },
-        'blog.views': {  # Логгер для вашего приложения
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': False,
+        'blog.profiling': {
+            'filters': ['sample_requests'],
         },
     },
-}
\ No newline at end of file
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from blog import views
+from blog import api, sitemaps, views
 from django.urls import path, include
 
 from django.conf.urls.static import static
@@ -7,10 +7,25 @@ from django.conf import settings
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('page/<int:page>', views.index, name='index'),
+    path('page/<int:page>', views.index_page, name='index_page'),
     path('post/<slug:slug>', views.post_detail, name='post_detail'),
+    path('post/<slug:slug>/comments', views.post_comments, name='post_comments'),
+    path('post/<slug:slug>/like', views.like_post, name='like_post'),
     path('tag/<slug:tag_title>', views.tag_filter, name='tag_filter'),
+    path('tag/<slug:tag_title>/<str:kind>.xml', sitemaps.feed, name='tag_feed'),
+    path('feed/<str:kind>.xml', sitemaps.feed, name='feed'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:name>.xml', sitemaps.sitemap_section, name='sitemap_section'),
+    path('archive/<int:year>', views.archive_year, name='archive_year'),
+    path('archive/<int:year>/<int:month>', views.archive_month, name='archive_month'),
+    path('search/', views.search, name='search'),
     path('contacts/', views.contacts, name='contacts'),
+    path('profiling/stats', views.profiling_stats, name='profiling_stats'),
+    path('api/posts', api.post_list, name='api_post_list'),
+    path('api/posts/<slug:slug>', api.post_detail, name='api_post_detail'),
+    path('api/tags', api.tag_list, name='api_tag_list'),
+    path('api/export', api.export, name='api_export'),
+    path('page-views/report', views.page_views_report, name='page_views_report'),
     path('', views.index, name='index'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,37 @@
+$(function () {
+  var $button = $('#load-more-comments');
+  if (!$button.length) {
+    return;
+  }
+  var $list = $('.comment-list');
+
+  function renderComment(comment) {
+    var $desc = $('<div class="desc">')
+      .append($('<h5>').append($('<a href="#">').text(comment.author)))
+      .append($('<p class="date">').text(new Date(comment.published_at).toLocaleString()))
+      .append($('<p class="comment">').text(comment.text));
+    var $user = $('<div class="user justify-content-between d-flex">')
+      .append('<div class="thumb"><img alt=""></div>')
+      .append($desc);
+    return $('<div class="single-comment justify-content-between d-flex" style="margin-bottom: 15px;">').append($user);
+  }
+
+  $button.on('click', function (event) {
+    event.preventDefault();
+    $button.prop('disabled', true);
+    $.getJSON($button.attr('data-url'), {cursor: $button.attr('data-cursor')})
+      .done(function (page) {
+        $.each(page.comments, function (_, comment) {
+          $list.append(renderComment(comment));
+        });
+        if (page.next_cursor) {
+          $button.attr('data-cursor', page.next_cursor).prop('disabled', false);
+        } else {
+          $button.remove();
+        }
+      })
+      .fail(function () {
+        $button.prop('disabled', false);
+      });
+  });
+});
@@ -0,0 +1,29 @@
+$(function () {
+  var $button = $('#like-button');
+  if (!$button.length) {
+    return;
+  }
+  function getCookie(name) {
+    var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+    return match ? decodeURIComponent(match[1]) : null;
+  }
+
+  $button.on('click', function (event) {
+    event.preventDefault();
+    $.ajax({
+      url: $button.attr('data-url'),
+      method: 'POST',
+      data: {action: 'toggle'},
+      headers: {'X-CSRFToken': getCookie('csrftoken')}
+    })
+      .done(function (response) {
+        $button.toggleClass('liked', response.liked);
+        $button.find('.likes-amount').text(response.likes_amount);
+      })
+      .fail(function (xhr) {
+        if (xhr.status === 403) {
+          window.location = $button.attr('data-login-url') + '?next=' + encodeURIComponent(window.location.pathname);
+        }
+      });
+  });
+});